@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Literal, Optional
 import os
 
 # Check if running in production (Railway or Render)
@@ -16,7 +17,11 @@ class Settings(BaseSettings):
     # API Keys
     groq_api_key: str
     tavily_api_key: str
-    pollinations_api_key: str = None
+    pollinations_api_key: Optional[str] = None
+    
+    # Upstream API endpoints (override to point at local stand-ins, e.g. for load tests)
+    groq_base_url: Optional[str] = None
+    tavily_base_url: Optional[str] = None
     
     # Server
     backend_host: str = "0.0.0.0"
@@ -26,10 +31,87 @@ class Settings(BaseSettings):
     # Upload Configuration - use /tmp for production
     upload_dir: str = f"{DATA_DIR}/uploads"
     max_file_size: int = 10485760  # 10MB
+    # Bulk uploads: total request size, files per request and text extraction processes
+    max_bulk_size: int = 209715200  # 200MB
+    max_bulk_files: int = 500
+    ingest_workers: int = 4
+    # Resumable uploads idle for longer than this are removed (seconds)
+    upload_session_ttl: int = 86400
+    
+    # Chat images - stored by content hash and downscaled for the vision model
+    image_dir: str = f"{DATA_DIR}/images"
+    max_image_size: int = 20971520  # 20MB
+    image_max_dimension: int = 1120  # longest side sent to the vision model
+    image_jpeg_quality: int = 85
+    image_workers: int = 2
     
     # Vector Database (FAISS) - use /tmp for production
     faiss_persist_dir: str = f"{DATA_DIR}/faiss_db"
     
+    # Vector encoding: flat (float32), fp16, sq8 (int8) or pq (product quantization,
+    # for indexes with at least pq_min_vectors vectors; smaller ones use sq8).
+    # Existing indexes are converted on the fly when this changes.
+    vector_encoding: Literal["flat", "fp16", "sq8", "pq"] = "flat"
+    pq_min_vectors: int = 10000
+    pq_subquantizers: int = 48
+    # Keep exact float32 vectors on disk (memory-mapped) to re-rank quantized results
+    vector_rerank: bool = False
+    rerank_candidates: int = 50
+    # Thread indexes kept open (memory-mapped) per worker
+    index_cache_size: int = 64
+    
+    # Retrieval context: hits fetched per requested chunk (to replace duplicates), prompt
+    # budget for the packed document context (estimated tokens; default: what the raw
+    # top-k chunks would take) and similarity above which chunks count as duplicates
+    rag_overfetch: int = 4
+    rag_context_tokens: Optional[int] = None
+    rag_dedup_threshold: float = 0.85
+    
+    # Message search: most recent matches ranked per query
+    message_search_rank_window: int = 2000
+    
+    # Embeddings - backend is "sentence-transformers" or "quantized-cpu" (int8, CPU only);
+    # the model can be a hub name or a local directory
+    embedding_backend: Literal["sentence-transformers", "quantized-cpu"] = "sentence-transformers"
+    embedding_model: str = "all-MiniLM-L6-v2"
+    embedding_batch_size: int = 32
+    
+    # Admission control (per worker): concurrent operations per resource, how many
+    # requests may wait for a slot, and how long (seconds) before giving up with 503
+    llm_max_concurrency: int = 16
+    llm_queue_size: int = 64
+    embedding_max_concurrency: int = 2
+    embedding_queue_size: int = 32
+    search_max_concurrency: int = 8
+    search_queue_size: int = 32
+    admission_timeout: float = 30.0
+    
+    # Chat streams: events kept per stream for Last-Event-ID replay, seconds generation
+    # continues after the last client disconnects (0 = stop at once) and seconds a
+    # finished stream stays resumable
+    chat_stream_buffer: int = 2048
+    chat_stream_disconnect_grace: float = 60.0
+    chat_stream_retention: float = 60.0
+    
+    # Response compression: smallest body worth compressing (bytes) and gzip level (1-9)
+    gzip_minimum_size: int = 1024
+    gzip_level: int = 5
+    
+    # Profiling - the admin API and the profiling middleware are only enabled when
+    # admin_token is set. X-Profile requests use profile_mode ("cprofile" or "sampling");
+    # the sampler takes a stack every profile_interval seconds, and event loop stalls of
+    # at least profile_block_threshold seconds count as time blocked in sync code
+    admin_token: str = ""
+    profile_dir: str = f"{DATA_DIR}/profiles"
+    profile_keep: int = 50
+    profile_mode: str = "cprofile"
+    profile_interval: float = 0.005
+    profile_block_threshold: float = 0.02
+    
+    # Load the embedding model and vector store in the background at startup
+    # (otherwise they are loaded on first use)
+    warmup_on_startup: bool = True
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
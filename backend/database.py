@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import get_settings
@@ -30,4 +30,37 @@ def get_db():
 def init_db():
     """Initialize database tables."""
     from .models import thread  # Import models to register them
+    from .services import message_search
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    message_search.ensure_index(engine)
+
+
+def _add_missing_columns():
+    """Add columns introduced after a table was created.
+    
+    create_all() only creates missing tables, and there are no migrations,
+    so existing databases would otherwise fail on new columns. Only columns
+    that are nullable or have a server default can be added this way.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                definition = f"{column.name} {column_type}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    if isinstance(default, str):
+                        default = f"'{default}'"
+                    definition += f" DEFAULT {default}"
+                if not column.nullable:
+                    definition += " NOT NULL"
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
@@ -1,11 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import os
+import threading
 
 from .config import get_settings
 from .database import init_db
-from .routers import threads, chat, documents
+from .routers import threads, chat, documents, images, search, admin
+from .services import admission, chat_streams, context_packer, document_processor, http_cache, profiling, upload_service, warmup
 
 settings = get_settings()
 
@@ -16,15 +19,23 @@ async def lifespan(app: FastAPI):
     # Startup
     print("Initializing database...")
     init_db()
+    warmup.mark("database", "ready")
     
     # Create upload directory if it doesn't exist
     os.makedirs(settings.upload_dir, exist_ok=True)
     os.makedirs(settings.faiss_persist_dir, exist_ok=True)
+    # Remove resumable uploads abandoned while the server was down
+    upload_service.expire_sessions()
+    
+    # Load heavy components in the background so /health answers immediately
+    if settings.warmup_on_startup:
+        threading.Thread(target=warmup.warm_up, name="warmup", daemon=True).start()
     
     print(f"Server starting on {settings.backend_host}:{settings.backend_port}")
     yield
     # Shutdown
     print("Server shutting down...")
+    document_processor.shutdown_workers()
 
 
 # Create FastAPI app
@@ -54,6 +65,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON responses (chat event streams are left alone)
+app.add_middleware(
+    http_cache.CompressionMiddleware,
+    minimum_size=settings.gzip_minimum_size,
+    compresslevel=settings.gzip_level
+)
+
+# Request profiling - only installed when an admin token is configured
+if settings.admin_token:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 
 # Health check endpoint
 @app.get("/health")
@@ -65,10 +87,60 @@ async def health_check():
     }
 
 
+# Readiness endpoint
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check reporting which components are warm."""
+    components = warmup.readiness()
+    ready = all(component["status"] == "ready" for component in components.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "warming",
+            "components": components
+        }
+    )
+
+
+# Metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Admission queue metrics for this worker in Prometheus text format."""
+    body = admission.render_metrics()
+    body += (
+        "# HELP chat_streams_active Chat responses being generated.\n"
+        "# TYPE chat_streams_active gauge\n"
+        f"chat_streams_active {chat_streams.active_count()}\n"
+        "# HELP rag_context_packed_total Retrieval contexts packed.\n"
+        "# TYPE rag_context_packed_total counter\n"
+        f"rag_context_packed_total {context_packer.totals['requests']}\n"
+        "# HELP rag_context_raw_tokens_total Estimated tokens of the retrieved chunks before packing.\n"
+        "# TYPE rag_context_raw_tokens_total counter\n"
+        f"rag_context_raw_tokens_total {context_packer.totals['raw_tokens']}\n"
+        "# HELP rag_context_packed_tokens_total Estimated tokens of the packed context sent to the LLM.\n"
+        "# TYPE rag_context_packed_tokens_total counter\n"
+        f"rag_context_packed_tokens_total {context_packer.totals['packed_tokens']}\n"
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.exception_handler(admission.Overloaded)
+async def overloaded_handler(request: Request, exc: admission.Overloaded):
+    """Reject work that cannot be admitted, telling clients when to retry."""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 # Include routers
 app.include_router(threads.router, prefix="/api/threads", tags=["Threads"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
+app.include_router(images.router, prefix="/api/images", tags=["Images"])
+app.include_router(search.router, prefix="/api/search", tags=["Search"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 
 if __name__ == "__main__":
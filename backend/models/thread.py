@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Boolean
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from ..database import Base
 
 
+def utcnow() -> datetime:
+    """Current UTC time with microseconds (SQLite's CURRENT_TIMESTAMP only has seconds)."""
+    return datetime.now(timezone.utc)
+
+
 class Thread(Base):
     """Conversation thread model."""
     __tablename__ = "threads"
@@ -11,7 +17,8 @@ class Thread(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Set in Python on update so changes within the same second still change ETags
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=utcnow)
     thread_metadata = Column(JSON, default={})
     
     # Relationships
@@ -28,6 +35,7 @@ class Message(Base):
     role = Column(String(20), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
     sources = Column(JSON, default=[])  # List of document names or URLs
+    truncated = Column(Boolean, nullable=False, default=False, server_default="0")  # Generation was cancelled
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -43,6 +51,7 @@ class Document(Base):
     filename = Column(String(255), nullable=False)
     file_path = Column(String(512), nullable=False)
     file_type = Column(String(10), nullable=False)  # pdf, txt, docx, md
+    checksum = Column(String(64), nullable=True)  # SHA-256 of the uploaded bytes
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
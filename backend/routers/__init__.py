@@ -1,5 +1,8 @@
 from . import threads
 from . import chat
 from . import documents
+from . import images
+from . import search
+from . import admin
 
-__all__ = ["threads", "chat", "documents"]
+__all__ = ["threads", "chat", "documents", "images", "search", "admin"]
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import FileResponse
+from typing import List, Optional
+import os
+
+from ..schemas.thread import ProfilingArm, ProfilingStatus
+from ..services import profiling
+from ..config import get_settings
+
+router = APIRouter()
+settings = get_settings()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow only requests carrying the admin token; hide the API when none is configured."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiling.is_admin(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.get("/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+async def get_profiling():
+    """Get the profiler's state."""
+    return profiling.status()
+
+
+@router.post("/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+async def arm_profiling(arm: ProfilingArm):
+    """Profile the next N chat and upload requests."""
+    return profiling.arm(arm.requests, arm.mode)
+
+
+@router.delete("/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+async def disarm_profiling():
+    """Stop profiling requests that have not started yet."""
+    return profiling.disarm()
+
+
+@router.get("/profiles", response_model=List[dict], dependencies=[Depends(require_admin)])
+def list_profiles():
+    """List stored profiles, newest first, with loop blocking time and top functions."""
+    return profiling.list_profiles()
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def download_profile(profile_id: str):
+    """Download a profile (.prof for pstats/snakeviz, .collapsed for flame graphs)."""
+    path = profiling.profile_file(profile_id)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} not found"
+        )
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
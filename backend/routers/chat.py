@@ -1,22 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import json
+from typing import Optional
 import asyncio
 
-from ..database import get_db
+from ..database import get_db, SessionLocal
 from ..models.thread import Thread, Message
 from ..schemas.thread import ChatRequest
+from ..services import admission, chat_streams, image_store
 from ..services.llm_service import LLMService
 from ..services.rag_service import RAGService
 from ..services.search_service import SearchService
+from ..services.upload_service import UploadError
 
 router = APIRouter()
 
 
 @router.post("")
-async def chat(request: ChatRequest, db: Session = Depends(get_db)):
-    """Send a chat message and get streaming response."""
+async def chat(
+    request: ChatRequest,
+    last_event_id: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Send a chat message and get streaming response.
+    
+    A retry carrying `Last-Event-ID` resumes the stream that event came from
+    instead of saving and answering the message again.
+    """
+    if last_event_id:
+        stream, after = _resumable_stream(last_event_id)
+        if stream.thread_id != request.thread_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Last-Event-ID belongs to another thread"
+            )
+        return _stream_response(stream, after)
     
     # Verify thread exists
     thread = db.query(Thread).filter(Thread.id == request.thread_id).first()
@@ -26,6 +44,16 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
             detail=f"Thread {request.thread_id} not found"
         )
     
+    # Verify the referenced image exists
+    if request.image_id:
+        try:
+            image_store.get_image(request.image_id)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    # Answer 429 right away instead of streaming into a full queue
+    admission.llm.check()
+    
     # Save user message
     user_message = Message(
         thread_id=request.thread_id,
@@ -35,98 +63,214 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
     db.add(user_message)
     db.commit()
     
-    async def generate_response():
-        """Generate streaming response."""
-        try:
-            # Initialize services
-            rag_service = RAGService()
-            search_service = SearchService()
-            llm_service = LLMService()
-            
-            context = ""
-            sources = []
-            
-            # Get RAG context if documents exist
-            # Check if there are any documents for this thread first to avoid unnecessary status
-            has_docs = await rag_service.has_documents(request.thread_id)
-            if has_docs:
-                yield f"data: {json.dumps({'type': 'status', 'content': 'Reading documents...', 'icon': 'file'})}\n\n"
+    stream = chat_streams.register(request.thread_id)
+    stream.publish({'type': 'stream', 'stream_id': stream.id})
+    stream.task = asyncio.create_task(_produce_response(stream, request))
+    return _stream_response(stream, 0)
+
+
+@router.get("/streams/{stream_id}")
+async def resume_chat(
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None),
+    after: Optional[str] = Query(None, alias="last_event_id"),
+):
+    """Reattach to a chat stream, replaying the events after `Last-Event-ID`.
+    
+    The event id can also be passed as the `last_event_id` query parameter;
+    without one the stream is replayed from the start.
+    """
+    stream, seq = _resumable_stream(last_event_id or after or f"{stream_id}:0")
+    if stream.id != stream_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Last-Event-ID belongs to another stream"
+        )
+    return _stream_response(stream, seq)
+
+
+@router.post("/{stream_id}/cancel", status_code=status.HTTP_202_ACCEPTED)
+async def cancel_chat(stream_id: str):
+    """Stop generating a response; the partial answer is kept as truncated."""
+    stream = chat_streams.get(stream_id)
+    if not stream or not stream.cancel("cancelled"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Stream {stream_id} not found"
+        )
+    return {"stream_id": stream_id, "status": "cancelling"}
+
+
+def _resumable_stream(event_id: str):
+    """The stream an SSE event id belongs to, and the event's sequence number."""
+    try:
+        stream_id, seq = chat_streams.parse_event_id(event_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed Last-Event-ID"
+        )
+    stream = chat_streams.get(stream_id)
+    if not stream:
+        # Expired or served by another worker; the finished answer is saved in the thread
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Stream {stream_id} not found"
+        )
+    if seq > stream.seq:
+        # An id the stream never sent: waiting for it would hang until the stream ends
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Last-Event-ID is ahead of stream {stream_id}"
+        )
+    return stream, max(seq, 0)
+
+
+def _stream_response(stream: chat_streams.ChatStream, after: int) -> StreamingResponse:
+    # Closing the connection only detaches it: generation continues so the
+    # client can reconnect, and is cancelled if nobody does within the grace period
+    return StreamingResponse(
+        stream.subscribe(after),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Stream-Id": stream.id,
+        }
+    )
+
+
+async def _produce_response(stream: chat_streams.ChatStream, request: ChatRequest) -> None:
+    """Generate the response, publishing SSE events to the stream.
+    
+    Runs as its own task, independent of any connection, so it can be
+    cancelled (abandoned stream or the cancel endpoint), which aborts the
+    LLM stream, web search or retrieval in flight. The request's DB session
+    is closed once the response starts, so this uses its own.
+    """
+    emit = stream.publish
+    
+    def queued(resource: str):
+        def on_queued(position: int) -> None:
+            emit({'type': 'queue', 'resource': resource, 'position': position})
+        return on_queued
+    
+    db = SessionLocal()
+    sources = []
+    full_response = ""
+    generating = False
+    try:
+        # Initialize services
+        rag_service = RAGService()
+        search_service = SearchService()
+        llm_service = LLMService()
+        
+        context = ""
+        
+        # Get RAG context if documents exist
+        # Check if there are any documents for this thread first to avoid unnecessary status
+        has_docs = await rag_service.has_documents(request.thread_id)
+        if has_docs:
+            emit({'type': 'status', 'content': 'Reading documents...', 'icon': 'file'})
+            async with admission.embedding.slot(queued("embedding")):
                 rag_results = await rag_service.retrieve_context(
                     query=request.message,
                     thread_id=request.thread_id
                 )
-                if rag_results["context"]:
-                    context += f"\n\nRelevant document excerpts:\n{rag_results['context']}"
-                    sources.extend(rag_results["sources"])
-            
-            # Get web search results if enabled
-            if request.enable_search:
-                yield f"data: {json.dumps({'type': 'status', 'content': 'Searching the web...', 'icon': 'globe'})}\n\n"
+            if rag_results["context"]:
+                context += f"\n\nRelevant document excerpts:\n{rag_results['context']}"
+                sources.extend(rag_results["sources"])
+                emit({'type': 'context', 'stats': rag_results["stats"]})
+        
+        # Get web search results if enabled
+        if request.enable_search:
+            emit({'type': 'status', 'content': 'Searching the web...', 'icon': 'globe'})
+            async with admission.search.slot(queued("search")):
                 search_results = await search_service.search(request.message)
-                if search_results["context"]:
-                    context += f"\n\nWeb search results:\n{search_results['context']}"
-                    sources.extend(search_results["sources"])
-            
-            # Send sources if available
-            if sources:
-                yield f"data: {json.dumps({'type': 'sources', 'sources': sources})}\n\n"
-            
-            # Get conversation history
-            messages = db.query(Message).filter(
-                Message.thread_id == request.thread_id
-            ).order_by(Message.timestamp.desc()).limit(10).all()
-            messages.reverse()
-            
-            # Stream LLM response
-            yield f"data: {json.dumps({'type': 'status', 'content': 'Thinking...', 'icon': 'brain'})}\n\n"
-            full_response = ""
+            if search_results["context"]:
+                context += f"\n\nWeb search results:\n{search_results['context']}"
+                sources.extend(search_results["sources"])
+        
+        # Send sources if available
+        if sources:
+            emit({'type': 'sources', 'sources': sources})
+        
+        # Get conversation history
+        messages = db.query(Message).filter(
+            Message.thread_id == request.thread_id
+        ).order_by(Message.timestamp.desc()).limit(10).all()
+        messages.reverse()
+        
+        # Images uploaded out of band are already downscaled; read them off the event loop
+        image_data, image_type = request.image, None
+        if request.image_id:
+            image_data, image_type = await asyncio.to_thread(image_store.load_base64, request.image_id)
+        
+        # Stream LLM response
+        emit({'type': 'status', 'content': 'Thinking...', 'icon': 'brain'})
+        async with admission.llm.slot(queued("llm")):
+            generating = True
             async for token in llm_service.stream_chat(
                 message=request.message,
                 context=context,
-                image_data=request.image,
-                history=messages[:-1]  # Exclude the last message (current user message)
+                image_data=image_data,
+                history=messages[:-1],  # Exclude the last message (current user message)
+                image_type=image_type
             ):
                 full_response += token
-                yield f"data: {json.dumps({'type': 'token', 'content': token})}\n\n"
-            
-            # Save assistant message
-            assistant_message = Message(
+                emit({'type': 'token', 'content': token})
+            generating = False
+        
+        # Save assistant message
+        assistant_message = Message(
+            thread_id=request.thread_id,
+            role="assistant",
+            content=full_response,
+            sources=sources
+        )
+        db.add(assistant_message)
+        db.commit()
+        
+        # Auto-generate thread title if this is the first message
+        # Check if thread has only 2 messages (1 user + 1 assistant = first exchange)
+        message_count = db.query(Message).filter(
+            Message.thread_id == request.thread_id
+        ).count()
+        
+        if message_count == 2:  # First exchange complete
+            try:
+                # Generate title based on first user message
+                async with admission.llm.slot():
+                    new_title = await llm_service.generate_title(request.message)
+                thread = db.query(Thread).filter(Thread.id == request.thread_id).first()
+                thread.title = new_title
+                db.commit()
+            except Exception as e:
+                print(f"Error generating title: {e}")
+                # Continue even if title generation fails
+        
+        # Send completion signal
+        emit({'type': 'done'})
+    
+    except asyncio.CancelledError:
+        # Keep what was generated so far, marked as truncated
+        if generating and full_response:
+            db.rollback()
+            db.add(Message(
                 thread_id=request.thread_id,
                 role="assistant",
                 content=full_response,
-                sources=sources
-            )
-            db.add(assistant_message)
+                sources=sources,
+                truncated=True
+            ))
             db.commit()
-            
-            # Auto-generate thread title if this is the first message
-            # Check if thread has only 2 messages (1 user + 1 assistant = first exchange)
-            message_count = db.query(Message).filter(
-                Message.thread_id == request.thread_id
-            ).count()
-            
-            if message_count == 2:  # First exchange complete
-                try:
-                    # Generate title based on first user message
-                    new_title = await llm_service.generate_title(request.message)
-                    thread.title = new_title
-                    db.commit()
-                except Exception as e:
-                    print(f"Error generating title: {e}")
-                    # Continue even if title generation fails
-            
-            # Send completion signal
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
-            
-        except Exception as e:
-            error_msg = f"Error generating response: {str(e)}"
-            yield f"data: {json.dumps({'type': 'error', 'error': error_msg})}\n\n"
-    
-    return StreamingResponse(
-        generate_response(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
-    )
+        emit({'type': 'cancelled', 'reason': stream.cancel_reason})
+        raise
+    except admission.Overloaded as e:
+        emit({'type': 'error', 'error': e.detail, 'retry_after': e.retry_after})
+    except Exception as e:
+        error_msg = f"Error generating response: {str(e)}"
+        emit({'type': 'error', 'error': error_msg})
+    finally:
+        db.close()
+        stream.close()
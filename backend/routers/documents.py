@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List
+import asyncio
 import os
-import shutil
-from datetime import datetime
 
 from ..database import get_db
-from ..models.thread import Thread, Document
-from ..schemas.thread import DocumentResponse
+from ..models.thread import Thread, Document, utcnow
+from ..schemas.thread import (
+    DocumentResponse,
+    BulkUploadResponse,
+    UploadSessionCreate,
+    UploadSessionResponse
+)
 from ..services.document_processor import DocumentProcessor
+from ..services import admission, http_cache, upload_service
+from ..services.upload_service import IncomingFile, UploadError
 from ..config import get_settings
 
 router = APIRouter()
@@ -18,62 +24,51 @@ settings = get_settings()
 ALLOWED_EXTENSIONS = {".pdf", ".txt", ".docx", ".md"}
 
 
-@router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
-async def upload_document(
-    file: UploadFile = File(...),
-    thread_id: int = Form(...),
-    db: Session = Depends(get_db)
-):
-    """Upload and process a document for RAG."""
-    
-    # Verify thread exists
+def _upload_error(error: UploadError) -> HTTPException:
+    return HTTPException(status_code=error.status_code, detail=error.detail)
+
+
+def _get_thread(db: Session, thread_id: int) -> Thread:
     thread = db.query(Thread).filter(Thread.id == thread_id).first()
     if not thread:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Thread {thread_id} not found"
         )
-    
-    # Validate file extension
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    return thread
+
+
+def _validate_extension(filename: str) -> str:
+    file_ext = os.path.splitext(filename)[1].lower()
     if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File type {file_ext} not supported. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
         )
+    return file_ext
+
+
+async def _store_document(db: Session, thread_id: int, incoming: IncomingFile) -> Document:
+    """Move a received file into place, index it and record it."""
+    file_ext = os.path.splitext(incoming.filename)[1].lower()
+    file_path = upload_service.final_path(incoming.filename)
+    os.replace(incoming.path, file_path)
     
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.max_file_size:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File size exceeds maximum allowed size of {settings.max_file_size} bytes"
-        )
-    
-    # Create unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_filename = f"{timestamp}_{file.filename}"
-    file_path = os.path.join(settings.upload_dir, safe_filename)
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Process document
+    # Process document (embedding is CPU-bound, so uploads queue for a slot)
     try:
         processor = DocumentProcessor()
-        await processor.process_and_store(
-            file_path=file_path,
-            thread_id=thread_id,
-            filename=file.filename
-        )
+        async with admission.embedding.slot():
+            await processor.process_and_store(
+                file_path=file_path,
+                thread_id=thread_id,
+                filename=incoming.filename
+            )
     except Exception as e:
         # Clean up file if processing fails
         if os.path.exists(file_path):
             os.remove(file_path)
+        if isinstance(e, admission.Overloaded):
+            raise
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing document: {str(e)}"
@@ -82,9 +77,10 @@ async def upload_document(
     # Save document record
     document = Document(
         thread_id=thread_id,
-        filename=file.filename,
+        filename=incoming.filename,
         file_path=file_path,
-        file_type=file_ext.lstrip('.')
+        file_type=file_ext.lstrip('.'),
+        checksum=incoming.checksum
     )
     db.add(document)
     db.commit()
@@ -93,9 +89,295 @@ async def upload_document(
     return document
 
 
+@router.post(
+    "/upload",
+    response_model=DocumentResponse,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file", "thread_id"],
+                        "properties": {
+                            "file": {"type": "string", "format": "binary"},
+                            "thread_id": {"type": "integer"},
+                        },
+                    }
+                }
+            },
+        }
+    },
+)
+async def upload_document(request: Request, db: Session = Depends(get_db)):
+    """Upload and process a document for RAG.
+    
+    The multipart body is streamed straight to disk as it arrives, with the
+    size limit enforced and the SHA-256 checksum computed in the same pass.
+    """
+    # Reject before reading the body if processing could not be queued anyway
+    admission.embedding.check()
+    
+    try:
+        # Declared body size lets us answer 413 without reading anything
+        upload_service.check_content_length(
+            request.headers, settings.max_file_size, upload_service.MULTIPART_OVERHEAD
+        )
+        fields, files = await upload_service.stream_multipart(
+            request.headers,
+            request.stream(),
+            settings.max_file_size,
+            ALLOWED_EXTENSIONS
+        )
+    except UploadError as e:
+        raise _upload_error(e)
+    
+    try:
+        incoming = next((f for f in files if f.field_name == "file"), None)
+        if incoming is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Missing file field"
+            )
+        try:
+            thread_id = int(fields["thread_id"])
+        except (KeyError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Missing or invalid thread_id field"
+            )
+        
+        # Verify thread exists
+        _get_thread(db, thread_id)
+        document = await _store_document(db, thread_id, incoming)
+    finally:
+        # Removes anything that was not moved into place
+        await upload_service.discard(files)
+    
+    return document
+
+
+@router.post(
+    "/bulk",
+    response_model=BulkUploadResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["files", "thread_id"],
+                        "properties": {
+                            "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                            "thread_id": {"type": "integer"},
+                        },
+                    }
+                }
+            },
+        }
+    },
+)
+async def bulk_upload_documents(request: Request, db: Session = Depends(get_db)):
+    """Upload many documents, or zip archives of them, in one request.
+    
+    All files are indexed in a single update to the thread's index and
+    recorded together. Files that cannot be used are reported rather than
+    failing the whole upload.
+    """
+    admission.embedding.check()
+    try:
+        upload_service.check_content_length(
+            request.headers, settings.max_bulk_size, upload_service.MULTIPART_OVERHEAD
+        )
+        # Extensions are checked per file below so one bad file does not reject the rest
+        # Files over MAX_FILE_SIZE are dropped while streaming and reported below;
+        # archives may use the whole request since their members are checked on extraction
+        fields, received = await upload_service.stream_multipart(
+            request.headers,
+            request.stream(),
+            settings.max_file_size,
+            max_total_size=settings.max_bulk_size,
+            max_archive_size=settings.max_bulk_size,
+            skip_oversized=True
+        )
+    except UploadError as e:
+        raise _upload_error(e)
+    
+    incoming: List[IncomingFile] = []
+    try:
+        try:
+            thread_id = int(fields["thread_id"])
+        except (KeyError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Missing or invalid thread_id field"
+            )
+        _get_thread(db, thread_id)
+        
+        # Expand archives and screen files; all archives together may expand
+        # to at most the bulk request limit
+        report = []
+        extract_budget = settings.max_bulk_size
+        for upload in received:
+            file_ext = os.path.splitext(upload.filename)[1].lower()
+            if file_ext == ".zip":
+                extracted, skipped = await asyncio.to_thread(
+                    upload_service.extract_archive,
+                    upload,
+                    ALLOWED_EXTENSIONS,
+                    settings.max_file_size,
+                    settings.max_bulk_files - len(incoming),
+                    extract_budget
+                )
+                extract_budget -= sum(extracted_file.size for extracted_file in extracted)
+                incoming.extend(extracted)
+                report.extend(skipped)
+            elif file_ext not in ALLOWED_EXTENSIONS:
+                report.append({"filename": upload.filename, "status": "skipped",
+                               "error": f"File type {file_ext} not supported"})
+            elif upload.size > settings.max_file_size:
+                report.append({"filename": upload.filename, "status": "failed",
+                               "error": f"File size exceeds maximum allowed size of {settings.max_file_size} bytes"})
+            elif len(incoming) >= settings.max_bulk_files:
+                report.append({"filename": upload.filename, "status": "skipped",
+                               "error": f"More than {settings.max_bulk_files} files in one upload"})
+            else:
+                incoming.append(upload)
+        
+        # Move files into place and index them together
+        paths = [upload_service.final_path(upload.filename) for upload in incoming]
+        for upload, file_path in zip(incoming, paths):
+            os.replace(upload.path, file_path)
+        results = []
+        if incoming:
+            processor = DocumentProcessor()
+            try:
+                async with admission.embedding.slot():
+                    results = await processor.process_many(
+                        [(file_path, upload.filename) for upload, file_path in zip(incoming, paths)],
+                        thread_id
+                    )
+            except Exception as e:
+                for file_path in paths:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                if isinstance(e, admission.Overloaded):
+                    raise
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Error processing documents: {str(e)}"
+                )
+        
+        # Save document records in one transaction
+        documents = []
+        for upload, file_path, result in zip(incoming, paths, results):
+            if result["status"] != "processed":
+                os.remove(file_path)
+                continue
+            document = Document(
+                thread_id=thread_id,
+                filename=upload.filename,
+                file_path=file_path,
+                file_type=os.path.splitext(upload.filename)[1].lower().lstrip('.'),
+                checksum=upload.checksum
+            )
+            documents.append((document, result))
+        db.add_all([document for document, _ in documents])
+        db.flush()
+        for document, result in documents:
+            result["document_id"] = document.id
+        db.commit()
+        
+        report = results + report
+    finally:
+        # Removes uploads and extracted files that were not moved into place
+        await upload_service.discard(received + incoming)
+    
+    return {
+        "thread_id": thread_id,
+        "processed": sum(1 for result in report if result["status"] == "processed"),
+        "failed": sum(1 for result in report if result["status"] == "failed"),
+        "skipped": sum(1 for result in report if result["status"] == "skipped"),
+        "results": report
+    }
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(session: UploadSessionCreate, db: Session = Depends(get_db)):
+    """Start a resumable upload for a large file."""
+    _get_thread(db, session.thread_id)
+    _validate_extension(session.filename)
+    try:
+        return upload_service.create_session(session.thread_id, session.filename, session.size)
+    except UploadError as e:
+        raise _upload_error(e)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_session(upload_id: str):
+    """Get how many bytes of a resumable upload have been received."""
+    try:
+        return upload_service.get_session(upload_id)
+    except UploadError as e:
+        raise _upload_error(e)
+
+
+@router.patch("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def append_upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset")
+):
+    """Append the request body to a resumable upload at the given offset.
+    
+    After a dropped connection, ask for the current offset and continue from there.
+    """
+    try:
+        return await upload_service.append_to_session(
+            upload_id, upload_offset, request.headers, request.stream()
+        )
+    except UploadError as e:
+        raise _upload_error(e)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
+async def complete_upload_session(upload_id: str, db: Session = Depends(get_db)):
+    """Finish a resumable upload and process the document."""
+    admission.embedding.check()
+    try:
+        session = upload_service.get_session(upload_id)
+        _get_thread(db, session["thread_id"])
+        incoming = await upload_service.complete_session(upload_id)
+    except UploadError as e:
+        raise _upload_error(e)
+    
+    try:
+        return await _store_document(db, session["thread_id"], incoming)
+    finally:
+        await upload_service.discard([incoming])
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session(upload_id: str):
+    """Discard a resumable upload."""
+    try:
+        upload_service.abort_session(upload_id)
+    except UploadError as e:
+        raise _upload_error(e)
+    return None
+
+
 @router.get("", response_model=List[DocumentResponse])
-async def list_documents(thread_id: int, db: Session = Depends(get_db)):
+async def list_documents(thread_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """List all documents for a thread."""
+    validators = http_cache.document_list_validators(db, thread_id)
+    if http_cache.is_fresh(request, validators):
+        return http_cache.not_modified(validators)
+    response.headers.update(validators)
+    
     documents = db.query(Document).filter(
         Document.thread_id == thread_id
     ).order_by(Document.upload_date.desc()).all()
@@ -116,7 +398,9 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
     if os.path.exists(document.file_path):
         os.remove(document.file_path)
     
-    # Delete from database
+    # Delete from database; the thread counts as modified for conditional GETs
+    if document.thread:
+        document.thread.updated_at = utcnow()
     db.delete(document)
     db.commit()
     
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import FileResponse
+
+from ..schemas.thread import ImageResponse
+from ..services import image_store, upload_service
+from ..services.upload_service import UploadError
+from ..config import get_settings
+
+router = APIRouter()
+settings = get_settings()
+
+
+@router.post(
+    "",
+    response_model=ImageResponse,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file"],
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                    }
+                }
+            },
+        }
+    },
+)
+async def upload_image(request: Request):
+    """Upload an image for chat; reference it with image_id in chat requests.
+    
+    Images are stored by content hash, so uploading the same image twice
+    returns the same id. Large images are downscaled for the vision model.
+    """
+    files = []
+    try:
+        upload_service.check_content_length(
+            request.headers, settings.max_image_size, upload_service.MULTIPART_OVERHEAD
+        )
+        # The format is sniffed from the contents, so any file name is accepted here
+        _, files = await upload_service.stream_multipart(
+            request.headers, request.stream(), settings.max_image_size, None
+        )
+        incoming = next((f for f in files if f.field_name == "file"), None)
+        if incoming is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Missing file field"
+            )
+        return await image_store.store_image(incoming.path, incoming.checksum)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    finally:
+        await upload_service.discard(files)
+
+
+@router.get("/{image_id}")
+async def get_image(image_id: str):
+    """Get a stored image as sent to the vision model."""
+    try:
+        image = image_store.get_image(image_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return FileResponse(image_store.image_path(image_id), media_type=image["mime_type"])
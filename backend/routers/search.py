@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ..database import get_db
+from ..schemas.thread import MessageSearchResponse
+from ..services import message_search
+
+router = APIRouter()
+
+
+@router.get("/messages", response_model=MessageSearchResponse)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=500),
+    thread_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Search message history across all threads, or within one thread."""
+    results, has_more = message_search.search(db, q, thread_id=thread_id, limit=limit, offset=offset)
+    return {
+        "query": q,
+        "results": results,
+        "limit": limit,
+        "offset": offset,
+        "has_more": has_more
+    }
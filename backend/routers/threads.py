@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session, selectinload
 from typing import List
 
 from ..database import get_db
 from ..models.thread import Thread, Message
 from ..schemas.thread import ThreadCreate, ThreadUpdate, ThreadResponse
+from ..services import http_cache
 
 router = APIRouter()
 
 
 @router.get("", response_model=List[ThreadResponse])
-async def list_threads(db: Session = Depends(get_db)):
+async def list_threads(request: Request, response: Response, db: Session = Depends(get_db)):
     """Get all conversation threads."""
-    threads = db.query(Thread).order_by(Thread.updated_at.desc()).all()
+    validators = http_cache.thread_list_validators(db)
+    if http_cache.is_fresh(request, validators):
+        return http_cache.not_modified(validators)
+    response.headers.update(validators)
+    
+    # Load messages and documents in two queries instead of two per thread
+    threads = db.query(Thread).options(
+        selectinload(Thread.messages), selectinload(Thread.documents)
+    ).order_by(Thread.updated_at.desc()).all()
     return threads
 
 
@@ -27,14 +36,21 @@ async def create_thread(thread_data: ThreadCreate, db: Session = Depends(get_db)
 
 
 @router.get("/{thread_id}", response_model=ThreadResponse)
-async def get_thread(thread_id: int, db: Session = Depends(get_db)):
+async def get_thread(thread_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific thread with all messages and documents."""
-    thread = db.query(Thread).filter(Thread.id == thread_id).first()
+    validators = http_cache.thread_validators(db, thread_id)
+    if validators is not None and http_cache.is_fresh(request, validators):
+        return http_cache.not_modified(validators)
+    
+    thread = db.query(Thread).options(
+        selectinload(Thread.messages), selectinload(Thread.documents)
+    ).filter(Thread.id == thread_id).first()
     if not thread:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Thread {thread_id} not found"
         )
+    response.headers.update(validators)
     return thread
 
 
@@ -4,6 +4,15 @@ from .thread import (
     ThreadResponse,
     MessageResponse,
     DocumentResponse,
+    BulkUploadResult,
+    BulkUploadResponse,
+    UploadSessionCreate,
+    UploadSessionResponse,
+    ImageResponse,
+    MessageSearchResult,
+    MessageSearchResponse,
+    ProfilingArm,
+    ProfilingStatus,
     ChatRequest,
     ChatStreamResponse
 )
@@ -14,6 +23,15 @@ __all__ = [
     "ThreadResponse",
     "MessageResponse",
     "DocumentResponse",
+    "BulkUploadResult",
+    "BulkUploadResponse",
+    "UploadSessionCreate",
+    "UploadSessionResponse",
+    "ImageResponse",
+    "MessageSearchResult",
+    "MessageSearchResponse",
+    "ProfilingArm",
+    "ProfilingStatus",
     "ChatRequest",
     "ChatStreamResponse"
 ]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Literal
 
 
 class ThreadCreate(BaseModel):
@@ -20,6 +20,7 @@ class MessageResponse(BaseModel):
     role: str
     content: str
     sources: List[str] = []
+    truncated: bool = False
     timestamp: datetime
     
     class Config:
@@ -32,12 +33,56 @@ class DocumentResponse(BaseModel):
     thread_id: int
     filename: str
     file_type: str
+    checksum: Optional[str] = None
     upload_date: datetime
     
     class Config:
         from_attributes = True
 
 
+class BulkUploadResult(BaseModel):
+    """Schema for the outcome of one file in a bulk upload."""
+    filename: str
+    status: str  # 'processed', 'failed' or 'skipped'
+    document_id: Optional[int] = None
+    chunks: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkUploadResponse(BaseModel):
+    """Schema for bulk upload response."""
+    thread_id: int
+    processed: int
+    failed: int
+    skipped: int
+    results: List[BulkUploadResult]
+
+
+class UploadSessionCreate(BaseModel):
+    """Schema for starting a resumable upload."""
+    thread_id: int
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., gt=0)
+
+
+class UploadSessionResponse(BaseModel):
+    """Schema for the state of a resumable upload."""
+    upload_id: str
+    thread_id: int
+    filename: str
+    size: int
+    offset: int
+
+
+class ImageResponse(BaseModel):
+    """Schema for a stored chat image."""
+    id: str
+    mime_type: str
+    width: int
+    height: int
+    size: int
+
+
 class ThreadResponse(BaseModel):
     """Schema for thread response."""
     id: int
@@ -52,17 +97,57 @@ class ThreadResponse(BaseModel):
         from_attributes = True
 
 
+class MessageSearchResult(BaseModel):
+    """Schema for one message search hit."""
+    message_id: int
+    thread_id: int
+    thread_title: str
+    role: str
+    timestamp: datetime
+    snippet: str  # HTML-escaped message text with matched terms wrapped in <mark>
+    score: Optional[float] = None  # None past the rank window and without FTS5
+
+
+class MessageSearchResponse(BaseModel):
+    """Schema for a page of message search results."""
+    query: str
+    results: List[MessageSearchResult]
+    limit: int
+    offset: int
+    has_more: bool
+
+
+class ProfilingArm(BaseModel):
+    """Schema for arming the request profiler."""
+    requests: int = Field(1, ge=1, le=1000)
+    mode: Literal["cprofile", "sampling"] = "cprofile"
+
+
+class ProfilingStatus(BaseModel):
+    """Schema for the request profiler's state."""
+    armed: int  # Requests still to be profiled
+    mode: str
+    active: Optional[str] = None  # Id of the profile being taken
+
+
 class ChatRequest(BaseModel):
     """Schema for chat message request."""
     message: str = Field(..., min_length=1)
     thread_id: int
     enable_search: bool = False
-    image: Optional[str] = None
+    image: Optional[str] = None  # Inline base64 / data URL; prefer image_id
+    image_id: Optional[str] = None  # From POST /api/images
 
 
 class ChatStreamResponse(BaseModel):
     """Schema for streaming chat response."""
-    type: str  # 'token', 'sources', 'done', 'error'
-    content: Optional[str] = None
+    type: str  # 'stream', 'status', 'queue', 'context', 'token', 'sources', 'resync', 'done', 'cancelled', 'error'
+    stream_id: Optional[str] = None
+    content: Optional[str] = None  # resync: the answer so far, replacing what the client has
     sources: Optional[List[str]] = None
+    resource: Optional[str] = None  # queue: 'llm', 'embedding' or 'search'
+    position: Optional[int] = None  # queue: 1 = next in line
+    stats: Optional[dict] = None  # context: packing stats, e.g. tokens_saved
+    reason: Optional[str] = None  # cancelled: 'cancelled' or 'disconnected'
     error: Optional[str] = None
+    retry_after: Optional[int] = None
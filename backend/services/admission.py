@@ -0,0 +1,180 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# Upper bounds (seconds) of the queue wait-time histogram exported on /metrics
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Overloaded(Exception):
+    """A request could not be admitted; answered with 429/503 and Retry-After."""
+    
+    def __init__(self, resource: str, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.resource = resource
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class Limiter:
+    """Concurrency limit with a bounded FIFO wait queue for one resource class.
+    
+    Per worker process and per event loop; CPU-bound work admitted here should
+    run in a thread so waiting requests are not blocked behind it.
+    """
+    
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque = deque()  # (future, on_queued) in arrival order
+        self._hold_time = 1.0  # moving average of seconds a slot is held
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.timeouts_total = 0
+        self.wait_sum = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+    
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+    
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up for a new request."""
+        rounds = (self.waiting + 1) / max(self.limit, 1)
+        return max(1, math.ceil(self._hold_time * rounds))
+    
+    def check(self) -> None:
+        """Fail fast if a new request would be rejected right now."""
+        if self.active >= self.limit and self.waiting >= self.queue_size:
+            self.rejected_total += 1
+            raise Overloaded(
+                self.name, 429, self.retry_after(),
+                f"Too many concurrent {self.name} requests, try again later"
+            )
+    
+    @asynccontextmanager
+    async def slot(self, on_queued: Optional[Callable[[int], None]] = None):
+        """Hold one slot for the duration of the block.
+        
+        `on_queued(position)` is called when the request has to wait and again
+        whenever it moves up the queue (1 = next in line).
+        """
+        await self._acquire(on_queued)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold_time = 0.8 * self._hold_time + 0.2 * (time.monotonic() - start)
+            self._release()
+    
+    async def _acquire(self, on_queued) -> None:
+        start = time.monotonic()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._record_wait(0.0)
+            return
+        self.check()
+        
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, on_queued)
+        self._waiters.append(waiter)
+        if on_queued:
+            on_queued(len(self._waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            else:
+                future.cancel()
+                self._waiters.remove(waiter)
+                self._notify_positions()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.timeouts_total += 1
+            raise Overloaded(
+                self.name, 503, self.retry_after(),
+                f"Timed out waiting for a {self.name} slot, try again later"
+            )
+        self._record_wait(time.monotonic() - start)
+    
+    def _release(self) -> None:
+        if self._waiters:
+            # Hand the slot straight to the next waiter so it cannot be overtaken
+            future, _ = self._waiters.popleft()
+            future.set_result(None)
+            self._notify_positions()
+        else:
+            self.active -= 1
+    
+    def _notify_positions(self) -> None:
+        for position, (_, on_queued) in enumerate(self._waiters, start=1):
+            if on_queued:
+                on_queued(position)
+    
+    def _record_wait(self, seconds: float) -> None:
+        self.admitted_total += 1
+        self.wait_sum += seconds
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if seconds <= bound:
+                self.wait_buckets[i] += 1
+                break
+        else:
+            self.wait_buckets[-1] += 1
+
+
+llm = Limiter("llm", settings.llm_max_concurrency, settings.llm_queue_size, settings.admission_timeout)
+embedding = Limiter(
+    "embedding", settings.embedding_max_concurrency, settings.embedding_queue_size, settings.admission_timeout
+)
+search = Limiter("search", settings.search_max_concurrency, settings.search_queue_size, settings.admission_timeout)
+
+LIMITERS: Dict[str, Limiter] = {limiter.name: limiter for limiter in (llm, embedding, search)}
+
+
+def render_metrics() -> str:
+    """Admission metrics in the Prometheus text exposition format."""
+    lines = []
+    
+    def metric(name: str, kind: str, help_text: str, value_of) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for limiter in LIMITERS.values():
+            lines.append(f'{name}{{resource="{limiter.name}"}} {value_of(limiter)}')
+    
+    metric("admission_limit", "gauge", "Maximum concurrent operations.", lambda l: l.limit)
+    metric("admission_active", "gauge", "Operations currently holding a slot.", lambda l: l.active)
+    metric("admission_queue_depth", "gauge", "Requests waiting for a slot.", lambda l: l.waiting)
+    metric("admission_queue_capacity", "gauge", "Maximum requests waiting for a slot.", lambda l: l.queue_size)
+    metric("admission_admitted_total", "counter", "Requests admitted.", lambda l: l.admitted_total)
+    metric("admission_rejected_total", "counter", "Requests rejected because the queue was full.",
+           lambda l: l.rejected_total)
+    metric("admission_timeouts_total", "counter", "Requests that gave up waiting for a slot.",
+           lambda l: l.timeouts_total)
+    
+    name = "admission_wait_seconds"
+    lines.append(f"# HELP {name} Time admitted requests waited for a slot.")
+    lines.append(f"# TYPE {name} histogram")
+    for limiter in LIMITERS.values():
+        label = f'resource="{limiter.name}"'
+        cumulative = 0
+        for bound, count in zip(WAIT_BUCKETS, limiter.wait_buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label},le="+Inf"}} {limiter.admitted_total}')
+        lines.append(f"{name}_sum{{{label}}} {limiter.wait_sum:.6f}")
+        lines.append(f"{name}_count{{{label}}} {limiter.admitted_total}")
+    
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import uuid
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# Chat streams in this worker. A stream's events are numbered and the most
+# recent `chat_stream_buffer` of them are kept, so a client that lost its
+# connection can reconnect with `Last-Event-ID: <stream id>:<seq>` and
+# receive what it missed before following the live stream. Generation keeps
+# going without listeners for `chat_stream_disconnect_grace` seconds, and a
+# finished stream stays resumable for `chat_stream_retention` seconds.
+# The registry is per process: with several workers, resume and cancel
+# requests must reach the worker serving the stream.
+
+
+class ChatStream:
+    """A chat response generated in the background and relayed to any number of SSE connections."""
+    
+    def __init__(self, thread_id: int):
+        self.id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_reason: Optional[str] = None
+        self.seq = 0
+        # (seq, SSE text, tokens published before it)
+        self.events: deque = deque(maxlen=settings.chat_stream_buffer)
+        self.closed = False
+        self.subscribers = 0
+        # Answer so far, to resync clients that fell behind the buffer
+        self.tokens: List[str] = []
+        self.sources: list = []
+        self._changed = asyncio.Event()
+        self._abandon: Optional[asyncio.TimerHandle] = None
+    
+    def cancel(self, reason: str) -> bool:
+        """Cancel the producer task; returns False if it had already finished."""
+        if self.task is None or self.task.done():
+            return False
+        self.cancel_reason = reason
+        return self.task.cancel()
+    
+    def _format(self, seq: int, payload: dict) -> str:
+        return f"id: {self.id}:{seq}\ndata: {json.dumps(payload)}\n\n"
+    
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+    
+    def publish(self, payload: dict) -> None:
+        """Append an event to the stream."""
+        self.seq += 1
+        self.events.append((self.seq, self._format(self.seq, payload), len(self.tokens)))
+        if payload["type"] == "token":
+            self.tokens.append(payload["content"])
+        elif payload["type"] == "sources":
+            self.sources = payload["sources"]
+        self._notify()
+    
+    def close(self) -> None:
+        """Mark the stream finished; it stays resumable for the retention period."""
+        self.closed = True
+        if self._abandon:
+            self._abandon.cancel()
+        self._notify()
+        asyncio.get_running_loop().call_later(settings.chat_stream_retention, unregister, self.id)
+    
+    def _detach(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers or self.closed:
+            return
+        # Nobody is listening: give the client time to reconnect before giving up
+        if settings.chat_stream_disconnect_grace > 0:
+            self._abandon = asyncio.get_running_loop().call_later(
+                settings.chat_stream_disconnect_grace, self.cancel, "disconnected"
+            )
+        else:
+            self.cancel("disconnected")
+    
+    async def subscribe(self, after: int = 0) -> AsyncIterator[str]:
+        """SSE events numbered after `after`: buffered ones first, then live ones until the stream ends."""
+        self.subscribers += 1
+        if self._abandon:
+            self._abandon.cancel()
+            self._abandon = None
+        try:
+            while True:
+                changed = self._changed
+                first = self.events[0][0] if self.events else self.seq + 1
+                if after + 1 < first:
+                    # The missed events are gone: send the answer up to the oldest
+                    # buffered event in one piece, then replay the buffer
+                    after = first - 1
+                    yield self._format(after, {
+                        "type": "resync",
+                        "content": "".join(self.tokens[:self.events[0][2]]),
+                        "sources": self.sources,
+                    })
+                    continue
+                pending = [self.events[i][1] for i in range(after + 1 - first, len(self.events))]
+                if pending:
+                    after = self.seq
+                    yield "".join(pending)
+                    continue
+                if self.closed:
+                    return
+                await changed.wait()
+        finally:
+            self._detach()
+
+
+_streams: Dict[str, ChatStream] = {}
+
+
+def register(thread_id: int) -> ChatStream:
+    """Create and track a new stream."""
+    stream = ChatStream(thread_id)
+    _streams[stream.id] = stream
+    return stream
+
+
+def get(stream_id: str) -> Optional[ChatStream]:
+    """Get a stream that is in flight or recently finished."""
+    return _streams.get(stream_id)
+
+
+def unregister(stream_id: str) -> None:
+    """Stop tracking a stream."""
+    _streams.pop(stream_id, None)
+
+
+def parse_event_id(event_id: str) -> Tuple[str, int]:
+    """Split a `<stream id>:<seq>` event id; raises ValueError if malformed."""
+    stream_id, _, seq = event_id.strip().partition(":")
+    return stream_id, int(seq)
+
+
+def active_count() -> int:
+    """Number of streams still generating in this worker."""
+    return sum(1 for stream in _streams.values() if not stream.closed)
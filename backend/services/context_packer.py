@@ -0,0 +1,153 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# Shortest suffix/prefix match treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+# Words per shingle when comparing chunks for near-duplicates
+SHINGLE_WORDS = 5
+
+# Totals since startup, exported on /metrics
+totals = {"requests": 0, "raw_tokens": 0, "packed_tokens": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {hash(" ".join(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    for size in range(min(len(left), len(right), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class Span:
+    """Contiguous chunks of one source, merged with their overlap removed."""
+    
+    def __init__(self, source: str, position: int, text: str, rank: int):
+        self.source = source
+        self.positions = [position]
+        self.last = position
+        self.parts = [text]
+        self.rank = rank  # best search rank among its chunks
+    
+    def append(self, position: int, text: str, rank: int, max_overlap: int) -> None:
+        overlap = _overlap(self.parts[-1], text, max_overlap)
+        self.parts.append(text[overlap:] if overlap else "\n\n" + text)
+        self.positions.append(position)
+        self.last = position
+        self.rank = min(self.rank, rank)
+    
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def _format(source: str, text: str) -> str:
+    return f"[From {source}]\n{text}"
+
+
+def pack(
+    candidates: Sequence[Tuple[int, dict]],
+    max_chunks: int,
+    max_overlap: int,
+    token_budget: Optional[int] = None,
+    dedup_threshold: float = 0.85
+) -> Dict[str, any]:
+    """Pack ranked search hits into prompt context.
+    
+    `candidates` are (chunk position, {"text", "source"}) pairs in rank order,
+    where consecutive positions of one source are consecutive chunks of a
+    document. The best `max_chunks` hits that are not near-duplicates of a
+    better one are kept (later candidates only stand in for dropped
+    duplicates), adjacent hits are merged into spans with the splitter
+    overlap removed, and spans are added best-first while they fit in
+    `token_budget`. The budget defaults to the size of the raw top
+    `max_chunks` hits, so packing never makes the prompt larger.
+    """
+    # What the prompt cost before packing: the raw top hits, concatenated
+    baseline = "\n\n".join(_format(chunk["source"], chunk["text"]) for _, chunk in candidates[:max_chunks])
+    raw_tokens = estimate_tokens(baseline)
+    if token_budget is None:
+        token_budget = raw_tokens
+    
+    kept: List[Tuple[int, int, dict]] = []
+    seen_shingles: List[set] = []
+    duplicates = 0
+    for rank, (position, chunk) in enumerate(candidates):
+        if len(kept) >= max_chunks:
+            break
+        shingles = _shingles(chunk["text"])
+        if any(_similarity(shingles, other) >= dedup_threshold for other in seen_shingles):
+            duplicates += 1
+            continue
+        seen_shingles.append(shingles)
+        kept.append((position, rank, chunk))
+    
+    # Merge runs of consecutive positions from the same source
+    spans: List[Span] = []
+    for position, rank, chunk in sorted(kept, key=lambda hit: (hit[2]["source"], hit[0])):
+        previous = spans[-1] if spans else None
+        if previous and previous.source == chunk["source"] and previous.last == position - 1:
+            previous.append(position, chunk["text"], rank, max_overlap)
+        else:
+            spans.append(Span(chunk["source"], position, chunk["text"], rank))
+    
+    # Fill the budget best-first; a span that does not fit leaves room for smaller ones
+    selected: List[Tuple[Span, str]] = []
+    used = 0  # characters, separators included (estimate_tokens allows four per token)
+    for span in sorted(spans, key=lambda s: s.rank):
+        part = _format(span.source, span.text)
+        size = len(part) + (2 if selected else 0)
+        if used + size > token_budget * 4:
+            if selected:
+                continue
+            # Always keep the best hit, cut to the budget
+            part = part[:token_budget * 4]
+            size = len(part)
+        selected.append((span, part))
+        used += size
+    
+    context = "\n\n".join(part for _, part in selected)
+    sources = []
+    for span, _ in selected:
+        if span.source not in sources:
+            sources.append(span.source)
+    
+    packed_tokens = estimate_tokens(context)
+    stats = {
+        "candidates": len(candidates),
+        "duplicates_dropped": duplicates,
+        "chunks_used": sum(len(span.positions) for span, _ in selected),
+        "spans": len(selected),
+        "raw_tokens": raw_tokens,
+        "packed_tokens": packed_tokens,
+        "tokens_saved": raw_tokens - packed_tokens,
+    }
+    totals["requests"] += 1
+    totals["raw_tokens"] += raw_tokens
+    totals["packed_tokens"] += packed_tokens
+    
+    return {
+        "context": context,
+        "sources": sources,
+        "stats": stats
+    }
@@ -1,29 +1,69 @@
+import asyncio
+import multiprocessing
 import os
-from typing import List, Dict
-import PyPDF2
-import docx
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
-import faiss
-import numpy as np
-import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Optional, Tuple
 
 from ..config import get_settings
+from .embeddings import get_embedding_backend
+from . import vector_store
 
 settings = get_settings()
 
+# Chunking used for new documents; retrieval relies on the overlap when merging adjacent chunks
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# PDF parsing is pure Python and holds the GIL, so bulk uploads extract text in
+# worker processes. Spawned workers re-import the backend, so the pool is
+# created on first use and kept until shutdown; spawn avoids forking a server
+# that has model and I/O threads running
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, min(settings.ingest_workers, os.cpu_count() or 1)),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_workers() -> None:
+    """Stop the text extraction processes, if any were started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
 
 class DocumentProcessor:
     """Process and store documents for RAG using FAISS."""
     
-    def __init__(self):
+    def __init__(self, embedding_model=None):
+        # Parsing/ML libraries are imported lazily to keep app startup fast
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
             length_function=len,
         )
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.embedding_dim = 384  # Dimension for all-MiniLM-L6-v2
+        # Any object exposing encode(List[str]) and dimension works here (benchmarks pass a stub)
+        self._embedding_model = embedding_model
+    
+    @property
+    def embedding_model(self):
+        """Embedding backend, falling back to the shared one selected in settings."""
+        return self._embedding_model or get_embedding_backend()
+    
+    @property
+    def embedding_dim(self) -> int:
+        """Vector width reported by the embedding backend."""
+        return self.embedding_model.dimension
     
     def extract_text(self, file_path: str, file_type: str) -> str:
         """Extract text from different file types."""
@@ -38,6 +78,8 @@ class DocumentProcessor:
     
     def _extract_from_pdf(self, file_path: str) -> str:
         """Extract text from PDF."""
+        import PyPDF2
+        
         text = ""
         with open(file_path, "rb") as file:
             pdf_reader = PyPDF2.PdfReader(file)
@@ -47,6 +89,8 @@ class DocumentProcessor:
     
     def _extract_from_docx(self, file_path: str) -> str:
         """Extract text from DOCX."""
+        import docx
+        
         doc = docx.Document(file_path)
         return "\n".join([paragraph.text for paragraph in doc.paragraphs])
     
@@ -55,15 +99,15 @@ class DocumentProcessor:
         with open(file_path, "r", encoding="utf-8") as file:
             return file.read()
     
-    def _get_index_path(self, thread_id: int) -> str:
-        """Get the path for the FAISS index file."""
-        os.makedirs(settings.faiss_persist_dir, exist_ok=True)
-        return os.path.join(settings.faiss_persist_dir, f"thread_{thread_id}.index")
-    
-    def _get_metadata_path(self, thread_id: int) -> str:
-        """Get the path for the metadata file."""
-        os.makedirs(settings.faiss_persist_dir, exist_ok=True)
-        return os.path.join(settings.faiss_persist_dir, f"thread_{thread_id}_metadata.pkl")
+    def split_file(self, file_path: str) -> List[str]:
+        """Extract a document's text and split it into chunks."""
+        file_type = os.path.splitext(file_path)[1].lower()
+        text = self.extract_text(file_path, file_type)
+        
+        if not text.strip():
+            raise ValueError("Document contains no extractable text")
+        
+        return self.text_splitter.split_text(text)
     
     async def process_and_store(
         self, 
@@ -72,48 +116,118 @@ class DocumentProcessor:
         filename: str
     ) -> None:
         """Process document and store embeddings in FAISS."""
+        # Parsing, embedding and the index write all block; keep them off the event loop
+        await asyncio.to_thread(self._process_and_store, file_path, thread_id, filename)
+    
+    def _process_and_store(self, file_path: str, thread_id: int, filename: str) -> None:
+        # Extract text and split into chunks
+        chunks = self.split_file(file_path)
         
-        # Extract text
-        file_type = os.path.splitext(file_path)[1].lower()
-        text = self.extract_text(file_path, file_type)
+        # Generate embeddings and add them to the thread's index
+        self._embed_and_publish(thread_id, chunks, [filename] * len(chunks))
+    
+    async def process_many(self, files: List[Tuple[str, str]], thread_id: int) -> List[Dict]:
+        """Process several documents into a single index update.
         
-        if not text.strip():
-            raise ValueError("Document contains no extractable text")
+        `files` are (path, filename) pairs. Text is extracted in parallel worker
+        processes, the chunks of all files are embedded together and the index
+        is published once. Returns a result per file, in order, with a status
+        of "processed" (and its chunk count) or "failed" (and the error).
+        """
+        chunk_lists = await self._split_many([path for path, _ in files])
+        return await asyncio.to_thread(self._store_many, files, chunk_lists, thread_id)
+    
+    async def _split_many(self, paths: List[str]) -> List:
+        workers = min(settings.ingest_workers, os.cpu_count() or 1, len(paths))
+        if workers <= 1:
+            results = []
+            for path in paths:
+                try:
+                    results.append(await asyncio.to_thread(self.split_file, path))
+                except Exception as e:
+                    results.append(e)
+            return results
         
-        # Split into chunks
-        chunks = self.text_splitter.split_text(text)
+        loop = asyncio.get_running_loop()
+        executor = _get_executor()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, _split_file, path) for path in paths),
+            return_exceptions=True
+        )
+        if any(isinstance(result, BrokenProcessPool) for result in results):
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            if _executor is executor:
+                shutdown_workers()
+        return results
+    
+    def _store_many(self, files: List[Tuple[str, str]], chunk_lists: List, thread_id: int) -> List[Dict]:
+        results = []
+        texts, sources = [], []
+        for (_, filename), chunks in zip(files, chunk_lists):
+            if isinstance(chunks, BaseException):
+                results.append({"filename": filename, "status": "failed", "error": str(chunks)})
+                continue
+            results.append({"filename": filename, "status": "processed", "chunks": len(chunks)})
+            texts.extend(chunks)
+            sources.extend([filename] * len(chunks))
+        
+        if texts:
+            # One encode call: the backend batches across file boundaries
+            self._embed_and_publish(thread_id, texts, sources)
+        return results
+    
+    def _embed_and_publish(self, thread_id: int, chunks: List[str], chunk_sources: List[str]) -> None:
+        import numpy as np
         
         # Generate embeddings
         embeddings = self.embedding_model.encode(chunks)
         embeddings_np = np.array(embeddings).astype('float32')
         
-        # Load or create FAISS index
-        index_path = self._get_index_path(thread_id)
-        metadata_path = self._get_metadata_path(thread_id)
-        
-        if os.path.exists(index_path):
-            # Load existing index
-            index = faiss.read_index(index_path)
-            with open(metadata_path, 'rb') as f:
-                metadata_list = pickle.load(f)
-        else:
-            # Create new index
-            index = faiss.IndexFlatL2(self.embedding_dim)
-            metadata_list = []
-        
-        # Add new embeddings to index
-        index.add(embeddings_np)
-        
-        # Add metadata
-        for i, chunk in enumerate(chunks):
-            metadata_list.append({
-                "source": filename,
-                "chunk_index": len(metadata_list),
-                "text": chunk,
-                "thread_id": thread_id
-            })
+        # Writers of one thread are serialised; readers keep using the live
+        # generation until the new one is published
+        with vector_store.writer_lock(thread_id):
+            current = vector_store.load_for_update(thread_id)
+            if current is not None:
+                index, raw_vectors = current.index, current.raw_vectors
+                texts, sources = list(current.chunks.texts()), list(current.chunks.sources())
+            else:
+                # Index is created in the configured encoding on first add
+                index, raw_vectors, texts, sources = None, None, [], []
+            
+            if index is not None and index.d != embeddings_np.shape[1]:
+                # Built by a model of another width: re-embed the stored chunks as well
+                print(f"Re-embedding thread {thread_id}: index has dimension {index.d}, "
+                      f"embedding backend {embeddings_np.shape[1]}")
+                previous = np.array(self.embedding_model.encode(texts)).astype('float32')
+                embeddings_np = np.vstack([previous, embeddings_np])
+                index, raw_vectors = None, None
+            
+            # Add new embeddings to index (converting its encoding if settings changed)
+            index, raw_vectors = vector_store.add_vectors(
+                index, embeddings_np, self.embedding_dim, raw_vectors
+            )
+            texts.extend(chunks)
+            sources.extend(chunk_sources)
+            
+            vector_store.publish_generation(thread_id, index, texts, sources, raw_vectors)
+    
+    
+    def rebuild_index(self, thread_id: int) -> None:
+        """Re-embed a thread's stored chunks if its index was built by a model of another width."""
+        import numpy as np
         
-        # Save index and metadata
-        faiss.write_index(index, index_path)
-        with open(metadata_path, 'wb') as f:
-            pickle.dump(metadata_list, f)
+        with vector_store.writer_lock(thread_id):
+            current = vector_store.load_for_update(thread_id)
+            if current is None or current.index.d == self.embedding_dim:
+                return  # Nothing stored, or already rebuilt by another request
+            print(f"Re-embedding thread {thread_id}: index has dimension {current.index.d}, "
+                  f"embedding backend {self.embedding_dim}")
+            texts, sources = list(current.chunks.texts()), list(current.chunks.sources())
+            embeddings_np = np.array(self.embedding_model.encode(texts)).astype('float32')
+            index, raw_vectors = vector_store.add_vectors(None, embeddings_np, self.embedding_dim)
+            vector_store.publish_generation(thread_id, index, texts, sources, raw_vectors)
+
+
+def _split_file(file_path: str) -> List[str]:
+    # Module level so worker processes can run it
+    return DocumentProcessor().split_file(file_path)
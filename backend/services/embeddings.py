@@ -0,0 +1,118 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Type
+
+from ..config import get_settings
+
+# Heavy ML dependencies (torch via sentence_transformers) are imported on first
+# use so that importing the app stays fast and /health answers immediately.
+
+
+class EmbeddingBackend(ABC):
+    """Base class for embedding backends.
+    
+    Backends turn a batch of texts into a float32 matrix with one row per
+    text and expose the vector width as `dimension`.
+    """
+    
+    name = "base"
+    dimension: int
+    
+    @abstractmethod
+    def encode(self, texts: List[str]):
+        """Embed `texts` as a float32 matrix of shape (len(texts), dimension)."""
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Full-precision sentence-transformers model (the default)."""
+    
+    name = "sentence-transformers"
+    
+    def __init__(self, model_name_or_path: str, batch_size: int = 32):
+        from sentence_transformers import SentenceTransformer
+        
+        self.model = SentenceTransformer(model_name_or_path, device=self._device())
+        self.batch_size = batch_size
+        self.dimension = self.model.get_sentence_embedding_dimension()
+    
+    def _device(self) -> Optional[str]:
+        return None  # Let sentence-transformers pick CUDA when available
+    
+    def encode(self, texts: List[str]):
+        import numpy as np
+        
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype="float32")
+
+
+class QuantizedCPUBackend(SentenceTransformerBackend):
+    """Same model with its Linear layers dynamically quantized to int8 for CPU inference."""
+    
+    name = "quantized-cpu"
+    
+    def __init__(self, model_name_or_path: str, batch_size: int = 32):
+        super().__init__(model_name_or_path, batch_size)
+        import torch
+        
+        self.model = torch.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    
+    def _device(self) -> Optional[str]:
+        return "cpu"  # Dynamically quantized kernels only run on CPU
+    
+    def encode(self, texts: List[str]):
+        import torch
+        
+        with torch.inference_mode():
+            return super().encode(texts)
+
+
+BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    QuantizedCPUBackend.name: QuantizedCPUBackend,
+}
+
+_backend: Optional[EmbeddingBackend] = None
+_lock = threading.Lock()
+
+
+def create_embedding_backend(name: str, model_name_or_path: str, batch_size: int = 32) -> EmbeddingBackend:
+    """Instantiate an embedding backend by name."""
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend: {name}. Available: {', '.join(BACKENDS)}"
+        )
+    return BACKENDS[name](model_name_or_path, batch_size=batch_size)
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Get the shared embedding backend selected in settings, loading it on first use."""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                settings = get_settings()
+                _backend = create_embedding_backend(
+                    settings.embedding_backend,
+                    settings.embedding_model,
+                    settings.embedding_batch_size,
+                )
+    return _backend
+
+
+def set_embedding_backend(backend: Optional[EmbeddingBackend]) -> None:
+    """Install a process-wide backend (e.g. an offline stub); None resets to settings."""
+    global _backend
+    with _lock:
+        _backend = backend
+
+
+def is_loaded() -> bool:
+    """Check whether the embedding backend has been loaded."""
+    return _backend is not None
@@ -0,0 +1,117 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Sequence
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.middleware.gzip import GZipMiddleware
+
+from ..models.thread import Document, Message, Thread
+
+# Thread and document GETs are revalidated rather than re-sent. Their ETag is
+# a hash of a few aggregates (row counts, newest ids and timestamps) that
+# change whenever the response body would, so answering 304 costs a couple of
+# indexed queries and no ORM loading or serialization. `Cache-Control:
+# no-cache` lets browsers keep the response but makes them revalidate it on
+# every poll.
+
+# Chat responses are event streams (gzip would hold events back until its
+# buffer fills) and images are already compressed
+UNCOMPRESSED_PATHS = ("/api/chat", "/api/images")
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite returns naive datetimes holding UTC
+    if value is None:
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _validators(state: Sequence, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    digest = hashlib.sha1(repr(tuple(state)).encode("utf-8")).hexdigest()[:20]
+    # Weak: the same state is sent gzipped or not
+    headers = {"ETag": f'W/"{digest}"', "Cache-Control": "private, no-cache"}
+    # HTTP dates have one-second resolution: a Last-Modified from the current second
+    # could be followed by another change within it, and would then validate stale copies
+    if last_modified is not None and datetime.now(timezone.utc) - _utc(last_modified) >= timedelta(seconds=1):
+        headers["Last-Modified"] = format_datetime(_utc(last_modified).astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def _documents_state(db: Session, thread_id: int) -> tuple:
+    return tuple(db.query(
+        func.count(Document.id), func.max(Document.id), func.max(Document.upload_date)
+    ).filter(Document.thread_id == thread_id).one())
+
+
+def thread_list_validators(db: Session) -> Dict[str, str]:
+    """Validators for the list of all threads with their messages and documents."""
+    threads = db.query(func.count(Thread.id), func.max(Thread.id), func.max(Thread.updated_at)).one()
+    # Messages are only added, or deleted along with their thread
+    last_message = db.query(func.max(Message.id)).scalar()
+    documents = db.query(
+        func.count(Document.id), func.max(Document.id), func.max(Document.upload_date)
+    ).one()
+    # A deleted thread leaves no newer timestamp behind, so there is no Last-Modified
+    return _validators((*threads, last_message, *documents))
+
+
+def thread_validators(db: Session, thread_id: int) -> Optional[Dict[str, str]]:
+    """Validators for one thread with its messages and documents, or None if it does not exist."""
+    thread = db.query(Thread.updated_at).filter(Thread.id == thread_id).first()
+    if thread is None:
+        return None
+    messages = db.query(
+        func.count(Message.id), func.max(Message.id), func.max(Message.timestamp)
+    ).filter(Message.thread_id == thread_id).one()
+    documents = _documents_state(db, thread_id)
+    # Deleting a document touches its thread's updated_at
+    timestamps = [_utc(value) for value in (thread.updated_at, messages[2], documents[2]) if value is not None]
+    return _validators(
+        (thread_id, thread.updated_at, *messages, *documents),
+        max(timestamps) if timestamps else None
+    )
+
+
+def document_list_validators(db: Session, thread_id: int) -> Dict[str, str]:
+    """Validators for the list of a thread's documents."""
+    updated_at = db.query(Thread.updated_at).filter(Thread.id == thread_id).scalar()
+    documents = _documents_state(db, thread_id)
+    timestamps = [_utc(value) for value in (updated_at, documents[2]) if value is not None]
+    return _validators(
+        (thread_id, updated_at, *documents),
+        max(timestamps) if timestamps else None
+    )
+
+
+def is_fresh(request: Request, headers: Dict[str, str]) -> bool:
+    """Whether the client's cached copy is still current (If-None-Match, else If-Modified-Since)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or headers["ETag"].removeprefix("W/") in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]) <= _utc(since)
+    return False
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZip for large responses, except event streams and images."""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(UNCOMPRESSED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
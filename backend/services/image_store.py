@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from ..config import get_settings
+from .upload_service import UploadError
+
+settings = get_settings()
+
+# Formats the vision model accepts, by Pillow format name
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+EXIF_ORIENTATION = 0x0112
+
+# Pillow releases the GIL while decoding, resizing and encoding, so a small
+# thread pool keeps large photos from blocking the event loop or each other
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.image_workers, thread_name_prefix="images")
+    return _executor
+
+
+def _paths(image_id: str):
+    if len(image_id) != 64 or not all(c in "0123456789abcdef" for c in image_id):
+        raise UploadError(404, f"Image {image_id} not found")
+    base = os.path.join(settings.image_dir, image_id)
+    return f"{base}.json", f"{base}.bin"
+
+
+def get_image(image_id: str) -> dict:
+    """Get a stored image's metadata (id, mime_type, width, height, size)."""
+    meta_path, _ = _paths(image_id)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError(404, f"Image {image_id} not found")
+
+
+def image_path(image_id: str) -> str:
+    """Path of a stored image's (downscaled) bytes."""
+    return _paths(image_id)[1]
+
+
+def load_base64(image_id: str):
+    """Read a stored image as (base64 data, mime type) for the vision model."""
+    meta = get_image(image_id)
+    with open(image_path(image_id), "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii"), meta["mime_type"]
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Concurrent uploads of the same image must never see a partial file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _prepare(source_path: str, image_id: str) -> dict:
+    """Sniff, orient, downscale and store one image (runs in the worker pool)."""
+    from io import BytesIO
+    from PIL import Image, ImageOps, UnidentifiedImageError  # Imported lazily to keep app startup fast
+    
+    max_side = settings.image_max_dimension
+    try:
+        with Image.open(source_path) as image:
+            # The real format comes from the file's contents, not its name or Content-Type
+            source_format = image.format
+            if source_format not in MIME_TYPES:
+                raise UploadError(
+                    415, f"Image format {source_format} not supported. Allowed: {', '.join(MIME_TYPES)}"
+                )
+            upright = image.getexif().get(EXIF_ORIENTATION, 1) == 1
+            
+            if upright and max(image.size) <= max_side and source_format != "GIF":
+                # Already small enough: keep the original bytes
+                with open(source_path, "rb") as f:
+                    data = f.read()
+                mime_type = MIME_TYPES[source_format]
+                width, height = image.size
+            else:
+                if source_format == "JPEG":
+                    # Let the decoder skip detail we are about to throw away
+                    image.draft("RGB", (max_side, max_side))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((max_side, max_side), Image.LANCZOS)
+                buffer = BytesIO()
+                if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                    image.save(buffer, "PNG", optimize=True)
+                    mime_type = MIME_TYPES["PNG"]
+                else:
+                    image.convert("RGB").save(buffer, "JPEG", quality=settings.image_jpeg_quality, optimize=True)
+                    mime_type = MIME_TYPES["JPEG"]
+                data = buffer.getvalue()
+                width, height = image.size
+    except UnidentifiedImageError:
+        raise UploadError(400, "File is not a recognised image")
+    except Image.DecompressionBombError:
+        raise UploadError(400, "Image dimensions are too large")
+    except OSError:
+        raise UploadError(400, "Image is corrupt or truncated")
+    
+    meta = {
+        "id": image_id,
+        "mime_type": mime_type,
+        "width": width,
+        "height": height,
+        "size": len(data),
+        "original_format": source_format,
+        "original_size": os.path.getsize(source_path),
+    }
+    meta_path, data_path = _paths(image_id)
+    os.makedirs(settings.image_dir, exist_ok=True)
+    # Metadata last: an image only exists once its bytes are in place
+    _write_atomic(data_path, data)
+    _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    return meta
+
+
+async def store_image(source_path: str, checksum: str) -> dict:
+    """Store an uploaded image under its content hash, downscaled for the vision model.
+    
+    Uploading the same image again returns the stored copy without reprocessing.
+    """
+    try:
+        return get_image(checksum)
+    except UploadError:
+        pass
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _prepare, source_path, checksum)
@@ -1,7 +1,5 @@
 import re
 from typing import AsyncIterator, List
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 from ..config import get_settings
 from ..models.thread import Message
@@ -14,9 +12,12 @@ class LLMService:
     """LLM service using Groq with streaming support."""
     
     def __init__(self):
+        from langchain_groq import ChatGroq  # Imported lazily to keep app startup fast
+        
         # Primary model for text
         self.llm = ChatGroq(
             api_key=settings.groq_api_key,
+            base_url=settings.groq_base_url,
             model_name="llama-3.3-70b-versatile",
             temperature=0.7,
             streaming=True
@@ -25,6 +26,7 @@ class LLMService:
         # Vision model for image analysis
         self.vision_llm = ChatGroq(
             api_key=settings.groq_api_key,
+            base_url=settings.groq_base_url,
             model_name="llama-3.2-11b-vision-preview",
             temperature=0.5,
             streaming=True
@@ -44,9 +46,11 @@ When answering:
         message: str,
         context: str = "",
         image_data: str = None,
-        history: List[Message] = None
+        history: List[Message] = None,
+        image_type: str = None
     ) -> AsyncIterator[str]:
         """Stream chat completion response."""
+        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
         
         # 1. Image Generation Check
         # Robust regex for image generation triggers
@@ -80,16 +84,18 @@ When answering:
             
         # If Image Data is present, construct Multi-modal message
         if image_data:
-            # Clean base64 string if it has headers
+            # Clean base64 string if it has headers, keeping the declared type
             if "base64," in image_data:
-                image_data = image_data.split("base64,")[1]
+                header, image_data = image_data.split("base64,", 1)
+                if not image_type and header.startswith("data:"):
+                    image_type = header[len("data:"):].rstrip(";")
                 
             msg_content = [
                 {"type": "text", "text": user_content},
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{image_data}",
+                        "url": f"data:{image_type or 'image/jpeg'};base64,{image_data}",
                     },
                 },
             ]
@@ -111,6 +117,7 @@ When answering:
 
     async def generate_title(self, first_message: str) -> str:
         """Generate a concise title for a conversation based on the first message."""
+        from langchain_core.messages import HumanMessage
         
         prompt = f"""Generate a very short, concise title (2-4 words max) for a conversation that starts with this message:
 
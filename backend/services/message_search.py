@@ -0,0 +1,206 @@
+import html
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# On SQLite, messages are indexed in an FTS5 table that reads its text from
+# `messages` (external content) and is kept in sync by triggers, so inserts,
+# edits and deletes, including those cascaded from deleting a thread, update
+# the index in the same transaction. The thread id is indexed as a second
+# column, so a thread-scoped search intersects the term's posting list with
+# the thread's instead of filtering every match. Only the most recent
+# `message_search_rank_window` matches are ranked, which keeps words that
+# occur in most messages as cheap as rare ones; pages past the window list
+# the older matches newest first, unscored. Other databases fall back to
+# an unranked substring match. Rebuild by hand with
+# `python -m backend.services.message_search`.
+
+FTS_TABLE = "messages_fts"
+SNIPPET_TOKENS = 16
+# Private-use characters marking matches in snippets until the text is HTML-escaped
+MARK_START = "\ue000"
+MARK_END = "\ue001"
+
+_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        content, thread_id, content='messages', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content, thread_id) VALUES (new.id, new.content, new.thread_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, thread_id)
+        VALUES ('delete', old.id, old.content, old.thread_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, thread_id ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, thread_id)
+        VALUES ('delete', old.id, old.content, old.thread_id);
+        INSERT INTO {FTS_TABLE}(rowid, content, thread_id) VALUES (new.id, new.content, new.thread_id);
+    END""",
+]
+
+
+def is_supported(engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def ensure_index(engine) -> None:
+    """Create the FTS table and triggers, backfilling existing messages once."""
+    if not is_supported(engine):
+        return
+    with engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        for statement in _SCHEMA:
+            connection.execute(text(statement))
+        if not exists:
+            # Index messages written before the table existed
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def rebuild(engine) -> None:
+    """Re-index every message from scratch and merge the index segments."""
+    with engine.begin() as connection:
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+
+
+def build_match_query(query: str, thread_id: Optional[int] = None) -> Optional[str]:
+    """Turn free text into an FTS5 query matching messages that contain every word.
+    
+    Words are quoted, so FTS5 operators and punctuation typed by users are
+    treated as plain text. Words match on their stem ("uploads" finds
+    "uploaded"); prefix matching is left out because it merges the posting
+    lists of every term sharing the prefix on each query.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    match = "content : (" + " ".join(f'"{word}"' for word in words) + ")"
+    if thread_id is not None:
+        match += f' AND thread_id : "{int(thread_id)}"'
+    return match
+
+
+def highlight(snippet: str, substring: Optional[re.Pattern] = None) -> str:
+    """HTML-escape a snippet, then turn its match markers into `<mark>` tags.
+    
+    `substring` marks its matches first, for snippets that come without markers.
+    """
+    if substring is not None:
+        snippet = substring.sub(lambda match: f"{MARK_START}{match.group(0)}{MARK_END}", snippet)
+    escaped = html.escape(snippet)
+    return escaped.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def search(
+    db: Session,
+    query: str,
+    thread_id: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> Tuple[List[dict], bool]:
+    """Find messages matching `query`, best first.
+    
+    Returns one page of results and whether more follow. When a query matches
+    more messages than the rank window, only the most recent ones are ranked;
+    the rest follow them newest first, with no score.
+    """
+    engine = db.get_bind()
+    params = {"limit": limit + 1, "offset": offset}
+    substring = None
+    
+    if is_supported(engine):
+        match = build_match_query(query, thread_id)
+        if match is None:
+            return [], False
+        window = settings.message_search_rank_window
+        # Split the page between the ranked window and the older matches after it
+        ranked_limit = max(0, min(limit + 1, window - offset))
+        params.update(
+            match=match,
+            window=window,
+            ranked_limit=ranked_limit,
+            older_limit=limit + 1 - ranked_limit,
+            older_offset=max(0, offset - window)
+        )
+        # Rank the newest matches, then fetch snippets for the requested page only
+        sql = f"""
+            WITH hits AS (
+                SELECT rowid AS id, bm25({FTS_TABLE}, 1.0, 0.0) AS score
+                FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH :match
+                ORDER BY rowid DESC
+                LIMIT :window
+            ),
+            ranked AS (
+                SELECT id, score FROM hits ORDER BY score, id DESC LIMIT :ranked_limit OFFSET :offset
+            ),
+            older AS (
+                SELECT rowid AS id
+                FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH :match AND rowid < (SELECT min(id) FROM hits)
+                ORDER BY rowid DESC
+                LIMIT :older_limit OFFSET :older_offset
+            ),
+            page AS (
+                SELECT id, score, 0 AS tier FROM ranked
+                UNION ALL
+                SELECT id, NULL, 1 FROM older
+            )
+            SELECT m.id, m.thread_id, t.title, m.role, m.timestamp,
+                   snippet({FTS_TABLE}, 0, '{MARK_START}', '{MARK_END}', '…', {SNIPPET_TOKENS}) AS snippet,
+                   page.score
+            FROM page
+            JOIN {FTS_TABLE} ON {FTS_TABLE}.rowid = page.id AND {FTS_TABLE} MATCH :match
+            JOIN messages m ON m.id = page.id
+            JOIN threads t ON t.id = m.thread_id
+            ORDER BY page.tier, page.score, page.id DESC
+        """
+    else:
+        thread_filter = ""
+        if thread_id is not None:
+            thread_filter = "AND m.thread_id = :thread_id"
+            params["thread_id"] = thread_id
+        params["pattern"] = f"%{query}%"
+        substring = re.compile(re.escape(query), re.IGNORECASE)
+        sql = f"""
+            SELECT m.id, m.thread_id, t.title, m.role, m.timestamp,
+                   substr(m.content, 1, 200) AS snippet, NULL AS score
+            FROM messages m
+            JOIN threads t ON t.id = m.thread_id
+            WHERE lower(m.content) LIKE lower(:pattern) {thread_filter}
+            ORDER BY m.timestamp DESC
+            LIMIT :limit OFFSET :offset
+        """
+    
+    rows = db.execute(text(sql), params).all()
+    results = [
+        {
+            "message_id": row.id,
+            "thread_id": row.thread_id,
+            "thread_title": row.title,
+            "role": row.role,
+            "timestamp": row.timestamp,
+            "snippet": highlight(row.snippet, substring),
+            # bm25() is lower for better matches; flip it so higher means more relevant
+            "score": -row.score if row.score is not None else None,
+        }
+        for row in rows[:limit]
+    ]
+    return results, len(rows) > limit
+
+
+if __name__ == "__main__":
+    from ..database import engine
+    
+    rebuild(engine)
+    print(f"Rebuilt {FTS_TABLE}")
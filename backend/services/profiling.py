@@ -0,0 +1,313 @@
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# Profiles are taken of chat and upload requests, either for the next N
+# requests after an admin arms profiling or for requests sent with an
+# `X-Profile: <admin token>` header. Profilers see everything the process
+# does while they run, not just one request, so only one profile runs at a
+# time. The middleware is only installed when ADMIN_TOKEN is set.
+#
+# - cprofile: deterministic, every call on the event loop thread
+#   (coroutines included); saved as a pstats file.
+# - sampling: stacks of all threads (including to_thread workers) every
+#   `profile_interval` seconds; saved as collapsed stacks for flame graphs.
+#
+# Either way a watchdog coroutine measures how long the event loop went
+# without running callbacks, i.e. time spent blocked in sync code.
+
+MODES = ("cprofile", "sampling")
+# Requests that send a chat message or upload data; polls and downloads on the
+# same prefixes would otherwise use up armed profiles
+PROFILED_REQUESTS = {
+    "POST": re.compile(r"^/api/(chat|documents/(upload|bulk|uploads/[^/]+/complete)|images)/?$"),
+    "PATCH": re.compile(r"^/api/documents/uploads/[^/]+/?$"),
+}
+# Period of the event loop watchdog, seconds
+HEARTBEAT_INTERVAL = 0.005
+# Functions listed in a profile's summary
+TOP_FUNCTIONS = 20
+
+_PROFILE_ID = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{8}$")
+
+_armed = {"remaining": 0, "mode": "cprofile"}
+_current: Optional["Profile"] = None
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Whether `token` is the configured admin token (never true when none is set)."""
+    if not settings.admin_token or token is None:
+        return False
+    return secrets.compare_digest(token.encode("utf-8"), settings.admin_token.encode("utf-8"))
+
+
+def arm(requests: int, mode: str) -> dict:
+    """Profile the next `requests` chat or upload requests."""
+    _armed["remaining"] = requests
+    _armed["mode"] = mode
+    return status()
+
+
+def disarm() -> dict:
+    _armed["remaining"] = 0
+    return status()
+
+
+def status() -> dict:
+    return {
+        "armed": _armed["remaining"],
+        "mode": _armed["mode"],
+        "active": _current.id if _current else None,
+    }
+
+
+class LoopWatch:
+    """Measures how long the event loop goes without getting to run a callback."""
+    
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.last_tick = time.perf_counter()
+        self.blocked = 0.0
+        self.longest = 0.0
+        self.stalls = 0
+    
+    async def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            self.last_tick = time.perf_counter()
+            lag = self.last_tick - start - HEARTBEAT_INTERVAL
+            if lag >= self.threshold:
+                self.blocked += lag
+                self.longest = max(self.longest, lag)
+                self.stalls += 1
+    
+    def is_blocked(self) -> bool:
+        return time.perf_counter() - self.last_tick >= self.threshold + HEARTBEAT_INTERVAL
+
+
+def _collapse(frame) -> str:
+    """One stack as `root;...;leaf` with `function (file:line)` frames."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Samples the stacks of every thread at a fixed interval."""
+    
+    def __init__(self, interval: float, loop_thread: int, watch: LoopWatch):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.watch = watch
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+    
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            blocked = self.watch.is_blocked()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if thread_id == self.loop_thread:
+                    root = "event-loop (blocked)" if blocked else "event-loop"
+                else:
+                    root = names.get(thread_id, f"thread-{thread_id}")
+                self.stacks[f"{root};{_collapse(frame)}"] += 1
+            self.samples += 1
+    
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class Profile:
+    """One profiled request."""
+    
+    def __init__(self, mode: str, method: str, path: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.watch = LoopWatch(settings.profile_block_threshold)
+        self.profiler: Optional[cProfile.Profile] = None
+        self.sampler: Optional[Sampler] = None
+    
+    def start(self) -> None:
+        self.started_at = time.time()
+        self.start_time = time.perf_counter()
+        self.watch_task = asyncio.create_task(self.watch.run())
+        if self.mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = Sampler(settings.profile_interval, threading.get_ident(), self.watch)
+            self.sampler.start()
+    
+    async def finish(self, status_code: Optional[int]) -> None:
+        duration = time.perf_counter() - self.start_time
+        if self.profiler:
+            self.profiler.disable()
+        self.watch_task.cancel()
+        if self.sampler:
+            # Joining the sampler waits at most one interval
+            await asyncio.to_thread(self.sampler.stop)
+        meta = {
+            "id": self.id,
+            "mode": self.mode,
+            "method": self.method,
+            "path": self.path,
+            "status": status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 1),
+            "loop_blocked_ms": round(self.watch.blocked * 1000, 1),
+            "loop_longest_block_ms": round(self.watch.longest * 1000, 1),
+            "loop_stalls": self.watch.stalls,
+        }
+        # Writing a large profile is slow; keep it off the event loop
+        await asyncio.to_thread(self._save, meta)
+    
+    def _save(self, meta: dict) -> None:
+        os.makedirs(settings.profile_dir, exist_ok=True)
+        base = os.path.join(settings.profile_dir, self.id)
+        if self.profiler:
+            meta["file"] = f"{self.id}.prof"
+            self.profiler.dump_stats(f"{base}.prof")
+            stats = pstats.Stats(self.profiler)
+            meta["top"] = [
+                {
+                    "function": f"{name} ({os.path.basename(filename)}:{line})",
+                    "calls": calls,
+                    "total_ms": round(total * 1000, 2),
+                    "cumulative_ms": round(cumulative * 1000, 2),
+                }
+                for (filename, line, name), (_, calls, total, cumulative, _)
+                in sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+            ]
+        else:
+            meta["file"] = f"{self.id}.collapsed"
+            meta["samples"] = self.sampler.samples
+            with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+                for stack, count in self.sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            # Functions seen on top of the event loop's stack while it was blocked
+            blocked = Counter()
+            for stack, count in self.sampler.stacks.items():
+                if stack.startswith("event-loop (blocked);"):
+                    blocked[stack.rsplit(";", 1)[-1]] += count
+            meta["top"] = [
+                {"function": function, "samples": count}
+                for function, count in blocked.most_common(TOP_FUNCTIONS)
+            ]
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        _prune()
+
+
+def _prune() -> None:
+    """Keep only the newest `profile_keep` profiles."""
+    metas = sorted(name for name in os.listdir(settings.profile_dir) if name.endswith(".json"))
+    for name in metas[:-settings.profile_keep or None]:
+        profile_id = name[:-len(".json")]
+        for suffix in (".json", ".prof", ".collapsed"):
+            try:
+                os.remove(os.path.join(settings.profile_dir, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> List[dict]:
+    """Metadata of stored profiles, newest first."""
+    if not os.path.isdir(settings.profile_dir):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.profile_dir), reverse=True):
+        if name.endswith(".json"):
+            with open(os.path.join(settings.profile_dir, name), encoding="utf-8") as f:
+                profiles.append(json.load(f))
+    return profiles
+
+
+def profile_file(profile_id: str) -> Optional[str]:
+    """Path of a stored profile's data file, if it exists."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    for suffix in (".prof", ".collapsed"):
+        path = os.path.join(settings.profile_dir, profile_id + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _is_profiled(method: str, path: str) -> bool:
+    pattern = PROFILED_REQUESTS.get(method)
+    return pattern is not None and pattern.match(path) is not None
+
+
+def _claim(headers: dict) -> Optional[str]:
+    """Profiling mode for a request, or None if it should not be profiled."""
+    if _current is not None:
+        return None
+    if is_admin(headers.get("x-profile")):
+        mode = headers.get("x-profile-mode", settings.profile_mode)
+        return mode if mode in MODES else settings.profile_mode
+    if _armed["remaining"] > 0:
+        _armed["remaining"] -= 1
+        return _armed["mode"]
+    return None
+
+
+class ProfilingMiddleware:
+    """Profiles armed or `X-Profile` chat and upload requests, including streamed bodies."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        global _current
+        if scope["type"] != "http" or not _is_profiled(scope["method"], scope["path"]):
+            return await self.app(scope, receive, send)
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        mode = _claim(headers)
+        if mode is None:
+            return await self.app(scope, receive, send)
+        
+        profile = Profile(mode, scope["method"], scope["path"])
+        status_code = None
+        
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+        
+        _current = profile
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            try:
+                await profile.finish(status_code)
+            finally:
+                _current = None
@@ -1,11 +1,10 @@
+import asyncio
 from typing import Dict, List
-import os
-import pickle
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
 
 from ..config import get_settings
+from .embeddings import get_embedding_backend
+from . import context_packer, vector_store
+from .document_processor import CHUNK_OVERLAP, DocumentProcessor
 
 settings = get_settings()
 
@@ -13,16 +12,14 @@ settings = get_settings()
 class RAGService:
     """Retrieve relevant context from documents using FAISS."""
     
-    def __init__(self):
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, embedding_model=None):
+        # Any object exposing encode(List[str]) and dimension works here (benchmarks pass a stub)
+        self._embedding_model = embedding_model
     
-    def _get_index_path(self, thread_id: int) -> str:
-        """Get the path for the FAISS index file."""
-        return os.path.join(settings.faiss_persist_dir, f"thread_{thread_id}.index")
-    
-    def _get_metadata_path(self, thread_id: int) -> str:
-        """Get the path for the metadata file."""
-        return os.path.join(settings.faiss_persist_dir, f"thread_{thread_id}_metadata.pkl")
+    @property
+    def embedding_model(self):
+        """Embedding backend, falling back to the shared one selected in settings."""
+        return self._embedding_model or get_embedding_backend()
     
     async def retrieve_context(
         self, 
@@ -31,47 +28,49 @@ class RAGService:
         top_k: int = 3
     ) -> Dict[str, any]:
         """Retrieve relevant document chunks for a query."""
+        # Embedding and search are CPU-bound; run them off the event loop so a
+        # cancelled request stops waiting for them
+        return await asyncio.to_thread(self._retrieve, query, thread_id, top_k)
+    
+    def _retrieve(self, query: str, thread_id: int, top_k: int) -> Dict[str, any]:
+        import numpy as np
         
-        index_path = self._get_index_path(thread_id)
-        metadata_path = self._get_metadata_path(thread_id)
-        
-        # Check if index exists
-        if not os.path.exists(index_path):
+        # Check if index exists (mapped read-only and shared across workers)
+        thread_index = vector_store.load_thread_index(thread_id)
+        if thread_index is None:
             return {"context": "", "sources": []}
         
-        # Load index and metadata
-        index = faiss.read_index(index_path)
-        with open(metadata_path, 'rb') as f:
-            metadata_list = pickle.load(f)
+        # Indexes built by a model of another width are re-embedded on first read
+        if thread_index.index.d != self.embedding_model.dimension:
+            DocumentProcessor(embedding_model=self._embedding_model).rebuild_index(thread_id)
+            thread_index = vector_store.load_thread_index(thread_id)
+        
+        # Indexes stored with a different encoding are converted on first read
+        if vector_store.needs_conversion(thread_index.index):
+            thread_index = vector_store.convert_thread_index(thread_id)
+        chunks = thread_index.chunks
         
         # Generate query embedding
         query_embedding = self.embedding_model.encode([query])
         query_embedding_np = np.array(query_embedding).astype('float32')
         
-        # Search for similar chunks
-        distances, indices = index.search(query_embedding_np, min(top_k, len(metadata_list)))
-        
-        # Format context from retrieved chunks
-        context_parts = []
-        sources = set()
-        
-        for idx in indices[0]:
-            if idx < len(metadata_list):
-                metadata = metadata_list[idx]
-                source_name = metadata.get("source", "Unknown")
-                text = metadata.get("text", "")
-                
-                sources.add(source_name)
-                context_parts.append(f"[From {source_name}]\n{text}")
-        
-        context = "\n\n".join(context_parts)
+        # Over-fetch so duplicates among the top hits can be replaced
+        # (re-ranked exactly when raw vectors are kept)
+        candidates = min(top_k * settings.rag_overfetch, len(chunks))
+        distances, indices = vector_store.search(
+            thread_index.index, query_embedding_np, candidates, thread_index.raw_vectors
+        )
+        hits = [(int(idx), chunks[idx]) for idx in indices[0] if 0 <= idx < len(chunks)]
         
-        return {
-            "context": context,
-            "sources": list(sources)
-        }
+        # Drop near-duplicates, merge overlapping chunks and fit the token budget
+        return context_packer.pack(
+            hits,
+            max_chunks=top_k,
+            max_overlap=CHUNK_OVERLAP,
+            token_budget=settings.rag_context_tokens,
+            dedup_threshold=settings.rag_dedup_threshold
+        )
     
     async def has_documents(self, thread_id: int) -> bool:
         """Check if any documents exist for a thread."""
-        index_path = self._get_index_path(thread_id)
-        return os.path.exists(index_path)
+        return vector_store.has_index(thread_id)
@@ -1,5 +1,5 @@
+import asyncio
 from typing import Dict
-from tavily import TavilyClient
 
 from ..config import get_settings
 
@@ -10,7 +10,12 @@ class SearchService:
     """Web search integration using Tavily."""
     
     def __init__(self):
+        from tavily import TavilyClient  # Imported lazily to keep app startup fast
+        
         self.client = TavilyClient(api_key=settings.tavily_api_key)
+        if settings.tavily_base_url:
+            # Older tavily-python releases have no api_base_url argument
+            self.client.base_url = settings.tavily_base_url.rstrip('/')
     
     async def search(
         self, 
@@ -20,8 +25,10 @@ class SearchService:
         """Perform web search and return formatted results."""
         
         try:
-            # Perform search
-            response = self.client.search(
+            # Perform search (the client is blocking; running it in a thread keeps the
+            # event loop free and lets a cancelled request stop waiting for it)
+            response = await asyncio.to_thread(
+                self.client.search,
                 query=query,
                 max_results=max_results,
                 include_answer=True,
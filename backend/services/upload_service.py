@@ -0,0 +1,458 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+import zipfile
+import zlib
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# Uploads in progress live here until they are validated and moved into place
+PARTIAL_DIR_NAME = ".partial"
+# Allowance for multipart boundaries and headers when checking Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+# Minimum seconds between sweeps for expired resumable uploads
+SESSION_SWEEP_INTERVAL = 600
+
+_next_sweep = 0.0
+
+
+class UploadError(Exception):
+    """Upload rejected by a limit or validation rule."""
+    
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class UploadTooLarge(UploadError):
+    """Upload exceeded the maximum allowed file size."""
+    
+    def __init__(self, max_size: int):
+        super().__init__(413, f"File size exceeds maximum allowed size of {max_size} bytes")
+
+
+class ArchiveTooLarge(UploadError):
+    """Archive expanded to more than the bytes allowed for one upload."""
+    
+    def __init__(self, max_size: int):
+        super().__init__(413, f"Archive expands to more than {max_size} bytes")
+
+
+class IncomingFile:
+    """A file part streamed to a temporary path in the upload directory."""
+    
+    def __init__(self, field_name: str, filename: str, path: str, size: int, checksum: str):
+        self.field_name = field_name
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.checksum = checksum
+
+
+def partial_dir() -> str:
+    """Get the directory holding uploads in progress."""
+    path = os.path.join(settings.upload_dir, PARTIAL_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def safe_filename(filename: str) -> str:
+    """Strip any directory components a client put in the filename."""
+    return os.path.basename((filename or "").replace("\\", "/")) or "upload"
+
+
+def check_content_length(headers, max_size: int, overhead: int = 0) -> None:
+    """Reject a request before reading it when its declared body is already too large."""
+    content_length = headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + overhead:
+        raise UploadTooLarge(max_size)
+
+
+async def stream_multipart(
+    headers,
+    body: AsyncIterator[bytes],
+    max_file_size: int,
+    allowed_extensions: Optional[set] = None,
+    max_total_size: Optional[int] = None,
+    max_archive_size: Optional[int] = None,
+    skip_oversized: bool = False,
+) -> Tuple[Dict[str, str], List[IncomingFile]]:
+    """Parse a multipart body as it arrives, streaming file parts to disk.
+    
+    Each file is written in chunks with non-blocking I/O while its SHA-256 is
+    computed, and the size limits (per file, with `max_archive_size` for .zip
+    files if given, and for all files together) are enforced as bytes arrive.
+    With `skip_oversized`, a file over its limit is deleted as soon as it
+    exceeds it and the rest of the body is still read; it is returned with its
+    full size and no checksum so the caller can report it. Returns the plain
+    form fields and the received files. On error all partial files are removed.
+    """
+    content_type, params = parse_options_header(headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError(400, "Expected a multipart/form-data body")
+    
+    events: List[Tuple[str, bytes]] = []
+    header_field = bytearray()
+    header_value = bytearray()
+    
+    callbacks = {
+        "on_part_begin": lambda: events.append(("begin", b"")),
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", b"")),
+        "on_header_field": lambda data, start, end: header_field.extend(data[start:end]),
+        "on_header_value": lambda data, start, end: header_value.extend(data[start:end]),
+        "on_header_end": lambda: _end_header(events, header_field, header_value),
+    }
+    parser = MultipartParser(params[b"boundary"], callbacks)
+    
+    fields: Dict[str, str] = {}
+    files: List[IncomingFile] = []
+    part: dict = {}
+    total = 0
+    
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+            for event, data in events:
+                if event == "begin":
+                    part = {}
+                elif event == "header":
+                    name, _, value = data.partition(b"\0")
+                    if name.lower() == b"content-disposition":
+                        await _start_part(part, value, allowed_extensions)
+                        if "file" in part:
+                            part["limit"] = max_file_size
+                            if max_archive_size is not None and part["filename"].lower().endswith(".zip"):
+                                part["limit"] = max_archive_size
+                elif event == "data":
+                    total += len(data)
+                    if max_total_size is not None and total > max_total_size:
+                        raise UploadTooLarge(max_total_size)
+                    await _write_part(part, data, skip_oversized)
+                elif event == "end":
+                    if "file" in part:
+                        await part["file"].close()
+                        checksum = "" if part["size"] > part["limit"] else part["hash"].hexdigest()
+                        files.append(IncomingFile(
+                            part["name"], part["filename"], part["path"], part["size"], checksum
+                        ))
+                    elif "name" in part:
+                        fields[part["name"]] = bytes(part["value"]).decode("utf-8")
+                    part = {}
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        if "file" in part:
+            await part["file"].close()
+            files.append(IncomingFile(part["name"], part["filename"], part["path"], 0, ""))
+        await discard(files)
+        raise
+    
+    return fields, files
+
+
+def _end_header(events: list, field: bytearray, value: bytearray) -> None:
+    events.append(("header", bytes(field) + b"\0" + bytes(value)))
+    field.clear()
+    value.clear()
+
+
+async def _start_part(part: dict, disposition: bytes, allowed_extensions: Optional[set]) -> None:
+    _, options = parse_options_header(disposition)
+    part["name"] = options.get(b"name", b"").decode("utf-8")
+    if b"filename" not in options:
+        part["value"] = bytearray()
+        return
+    
+    filename = safe_filename(options[b"filename"].decode("utf-8"))
+    extension = os.path.splitext(filename)[1].lower()
+    if allowed_extensions is not None and extension not in allowed_extensions:
+        # Rejected from the part headers, before any file data is stored
+        raise UploadError(
+            400, f"File type {extension} not supported. Allowed: {', '.join(sorted(allowed_extensions))}"
+        )
+    part["filename"] = filename
+    part["path"] = os.path.join(partial_dir(), f"{uuid.uuid4().hex}{extension}")
+    part["file"] = await aiofiles.open(part["path"], "wb")
+    part["size"] = 0
+    part["hash"] = hashlib.sha256()
+
+
+async def _write_part(part: dict, data: bytes, skip_oversized: bool) -> None:
+    if "file" not in part:
+        part.setdefault("value", bytearray()).extend(data)
+        if len(part["value"]) > MULTIPART_OVERHEAD:
+            raise UploadError(400, "Form field too large")
+        return
+    already_oversized = part["size"] > part["limit"]
+    part["size"] += len(data)
+    if already_oversized:
+        return  # Only counted from here on
+    if part["size"] > part["limit"]:
+        if not skip_oversized:
+            raise UploadTooLarge(part["limit"])
+        # Free the space now rather than after the whole file has arrived
+        await part["file"].close()
+        await aiofiles.os.remove(part["path"])
+        return
+    part["hash"].update(data)
+    await part["file"].write(data)
+
+
+async def discard(files: List[IncomingFile]) -> None:
+    """Remove temporary files of a failed upload."""
+    for incoming in files:
+        try:
+            await aiofiles.os.remove(incoming.path)
+        except FileNotFoundError:
+            pass
+
+
+def extract_archive(
+    archive: IncomingFile,
+    allowed_extensions: set,
+    max_file_size: int,
+    max_files: int,
+    max_total_size: int
+) -> Tuple[List[IncomingFile], List[dict]]:
+    """Unpack a zip upload into the partial directory (blocking; run in a thread).
+    
+    Returns the extracted files and a status entry for each member that was
+    skipped or failed. Members are copied with the size limits enforced on the
+    bytes actually read, whatever sizes the archive declares: `max_file_size`
+    per member and `max_total_size` for all of them together. An archive that
+    expands beyond the total fails as a whole and leaves no files behind.
+    """
+    files: List[IncomingFile] = []
+    report: List[dict] = []
+    extracted = 0
+    try:
+        with zipfile.ZipFile(archive.path) as zf:
+            for member in zf.infolist():
+                name = member.filename.replace("\\", "/")
+                label = f"{archive.filename}/{name}"
+                filename = safe_filename(name)
+                if member.is_dir() or name.startswith("__MACOSX/") or filename.startswith("."):
+                    continue
+                extension = os.path.splitext(filename)[1].lower()
+                if extension not in allowed_extensions:
+                    report.append({"filename": label, "status": "skipped",
+                                   "error": f"File type {extension} not supported"})
+                    continue
+                if len(files) >= max_files:
+                    report.append({"filename": label, "status": "skipped",
+                                   "error": f"More than {max_files} files in one upload"})
+                    continue
+                if member.file_size > max_file_size:
+                    report.append({"filename": label, "status": "failed",
+                                   "error": f"File size exceeds maximum allowed size of {max_file_size} bytes"})
+                    continue
+                if extracted + member.file_size > max_total_size:
+                    raise ArchiveTooLarge(max_total_size)
+                
+                path = os.path.join(partial_dir(), f"{uuid.uuid4().hex}{extension}")
+                checksum = hashlib.sha256()
+                size = 0
+                try:
+                    with zf.open(member) as source, open(path, "wb") as target:
+                        while chunk := source.read(1024 * 1024):
+                            size += len(chunk)
+                            if size > max_file_size:
+                                raise UploadTooLarge(max_file_size)
+                            if extracted + size > max_total_size:
+                                raise ArchiveTooLarge(max_total_size)
+                            checksum.update(chunk)
+                            target.write(chunk)
+                except ArchiveTooLarge:
+                    os.remove(path)
+                    raise
+                except (UploadError, RuntimeError, zipfile.BadZipFile, zlib.error) as e:
+                    # Oversized, encrypted or corrupt member
+                    if os.path.exists(path):
+                        os.remove(path)
+                    report.append({"filename": label, "status": "failed", "error": str(e)})
+                    continue
+                extracted += size
+                files.append(IncomingFile("files", filename, path, size, checksum.hexdigest()))
+    except zipfile.BadZipFile:
+        report.append({"filename": archive.filename, "status": "failed", "error": "Not a valid zip archive"})
+    except ArchiveTooLarge as e:
+        # Likely a zip bomb: drop everything it produced
+        for incoming in files:
+            if os.path.exists(incoming.path):
+                os.remove(incoming.path)
+        files = []
+        report.append({"filename": archive.filename, "status": "failed", "error": e.detail})
+    return files, report
+
+
+def final_path(filename: str) -> str:
+    """Get a unique destination path for an accepted upload."""
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    return os.path.join(settings.upload_dir, f"{timestamp}_{uuid.uuid4().hex[:8]}_{filename}")
+
+
+# Resumable uploads
+#
+# A session is created with the file's name and total size, then the client
+# appends byte ranges at the offset the server reports (so an interrupted
+# request is resumed rather than restarted) and finally completes it. State
+# is kept on disk next to the partial data, so any worker can serve any
+# request of a session and sessions survive restarts. Appends hold an
+# exclusive lock on the data file, so a retried request racing the original
+# gets a 409 instead of writing the same range twice. Sessions without
+# activity for `upload_session_ttl` seconds are removed.
+
+def _session_paths(upload_id: str) -> Tuple[str, str]:
+    if not upload_id.isalnum():
+        raise UploadError(404, f"Upload {upload_id} not found")
+    directory = partial_dir()
+    return os.path.join(directory, f"{upload_id}.json"), os.path.join(directory, f"{upload_id}.part")
+
+
+@contextmanager
+def _session_lock(upload_id: str):
+    """Hold a session's data file exclusively; raises a 409 if another request does."""
+    _, data_path = _session_paths(upload_id)
+    try:
+        lock_file = open(data_path, "rb")
+    except FileNotFoundError:
+        raise UploadError(404, f"Upload {upload_id} not found")
+    with lock_file:
+        if fcntl:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadError(409, f"Upload {upload_id} is already receiving data")
+        # Closing the file releases the lock
+        yield
+
+
+def expire_sessions() -> int:
+    """Remove resumable uploads idle for longer than `upload_session_ttl`; returns how many."""
+    global _next_sweep
+    _next_sweep = time.time() + SESSION_SWEEP_INTERVAL
+    cutoff = time.time() - settings.upload_session_ttl
+    expired = 0
+    for name in os.listdir(partial_dir()):
+        if not name.endswith(".json"):
+            continue
+        upload_id = name[:-len(".json")]
+        meta_path, data_path = _session_paths(upload_id)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                last_activity = json.load(f).get("created_at", 0)
+            if os.path.exists(data_path):
+                last_activity = max(last_activity, os.path.getmtime(data_path))
+            if last_activity >= cutoff:
+                continue
+            with _session_lock(upload_id):
+                abort_session(upload_id)
+        except (UploadError, OSError, ValueError):
+            # Busy, or removed by another worker meanwhile
+            continue
+        expired += 1
+    return expired
+
+
+def create_session(thread_id: int, filename: str, size: int) -> dict:
+    """Start a resumable upload and return its state."""
+    if size > settings.max_file_size:
+        raise UploadTooLarge(settings.max_file_size)
+    if time.time() >= _next_sweep:
+        expire_sessions()
+    upload_id = uuid.uuid4().hex
+    meta_path, data_path = _session_paths(upload_id)
+    session = {
+        "upload_id": upload_id,
+        "thread_id": thread_id,
+        "filename": safe_filename(filename),
+        "size": size,
+        "created_at": time.time(),
+    }
+    open(data_path, "wb").close()
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(session, f)
+    return {**session, "offset": 0}
+
+
+def get_session(upload_id: str) -> dict:
+    """Get a resumable upload's state, including bytes received so far."""
+    meta_path, data_path = _session_paths(upload_id)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            session = json.load(f)
+        return {**session, "offset": os.path.getsize(data_path)}
+    except FileNotFoundError:
+        raise UploadError(404, f"Upload {upload_id} not found")
+
+
+async def append_to_session(upload_id: str, offset: int, headers, body: AsyncIterator[bytes]) -> dict:
+    """Append a byte range to a resumable upload, starting at `offset`."""
+    with _session_lock(upload_id):
+        # Checked under the lock: a concurrent append at the same offset has either finished or failed
+        session = get_session(upload_id)
+        if offset != session["offset"]:
+            raise UploadError(409, f"Upload offset is {session['offset']}, not {offset}")
+        content_length = headers.get("content-length")
+        if content_length and content_length.isdigit() and offset + int(content_length) > session["size"]:
+            raise UploadError(413, f"Upload exceeds its declared size of {session['size']} bytes")
+        
+        _, data_path = _session_paths(upload_id)
+        received = session["offset"]
+        async with aiofiles.open(data_path, "ab") as f:
+            async for chunk in body:
+                received += len(chunk)
+                if received > session["size"]:
+                    raise UploadError(413, f"Upload exceeds its declared size of {session['size']} bytes")
+                # Bytes written before a dropped connection are kept; the client resumes after them
+                await f.write(chunk)
+    return {**session, "offset": received}
+
+
+async def complete_session(upload_id: str) -> IncomingFile:
+    """Finish a resumable upload whose bytes have all arrived."""
+    with _session_lock(upload_id):
+        session = get_session(upload_id)
+        if session["offset"] != session["size"]:
+            raise UploadError(409, f"Upload incomplete: {session['offset']} of {session['size']} bytes received")
+        
+        meta_path, data_path = _session_paths(upload_id)
+        # Ranges may have arrived over several requests, so hash the assembled file once
+        checksum = hashlib.sha256()
+        async with aiofiles.open(data_path, "rb") as f:
+            while chunk := await f.read(1024 * 1024):
+                checksum.update(chunk)
+        
+        extension = os.path.splitext(session["filename"])[1].lower()
+        path = os.path.join(partial_dir(), f"{upload_id}{extension}")
+        await aiofiles.os.rename(data_path, path)
+        await aiofiles.os.remove(meta_path)
+    return IncomingFile("file", session["filename"], path, session["size"], checksum.hexdigest())
+
+
+def abort_session(upload_id: str) -> None:
+    """Discard a resumable upload."""
+    for path in _session_paths(upload_id):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,481 @@
+import json
+import mmap
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# Supported vector encodings and their approximate size per 384-dim vector:
+#   flat - raw float32 (1536 bytes), exact search
+#   fp16 - scalar-quantized half floats (768 bytes)
+#   sq8  - scalar-quantized int8 (384 bytes)
+#   pq   - product quantization (pq_subquantizers bytes), only used for large indexes
+ENCODINGS = ("flat", "fp16", "sq8", "pq")
+PQ_MIN_TRAINING_POINTS = 256
+
+
+def target_encoding(num_vectors: int) -> str:
+    """Get the configured encoding for an index holding `num_vectors` vectors."""
+    encoding = settings.vector_encoding
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown vector encoding: {encoding}. Available: {', '.join(ENCODINGS)}")
+    # PQ codebooks need plenty of training data (at least 256 points for 8-bit codes);
+    # small indexes use int8 instead
+    if encoding == "pq" and num_vectors < max(settings.pq_min_vectors, PQ_MIN_TRAINING_POINTS):
+        return "sq8"
+    return encoding
+
+
+def index_encoding(index) -> str:
+    """Get the encoding of an existing FAISS index."""
+    import faiss
+    
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest sub-quantizer count not above the setting that divides the dimension."""
+    m = min(settings.pq_subquantizers, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def create_index(dimension: int, encoding: str, training_vectors=None):
+    """Create an empty index with the given encoding, trained on `training_vectors` if needed."""
+    import faiss
+    
+    if encoding == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif encoding == "fp16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif encoding == "sq8":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif encoding == "pq":
+        index = faiss.IndexPQ(dimension, _pq_subquantizers(dimension), 8, faiss.METRIC_L2)
+    else:
+        raise ValueError(f"Unknown vector encoding: {encoding}")
+    
+    if not index.is_trained:
+        if training_vectors is None or len(training_vectors) == 0:
+            raise ValueError(f"{encoding} index needs training vectors")
+        index.train(training_vectors)
+    return index
+
+
+def exact_vectors(index, raw_vectors=None):
+    """Exact float32 vectors of every entry, or None if only lossy codes are left.
+    
+    Vectors reconstructed from a flat index are exact; those of a quantized
+    index are not, and must never be stored as if they were.
+    """
+    if raw_vectors is not None:
+        return raw_vectors
+    if index_encoding(index) == "flat":
+        return index.reconstruct_n(0, index.ntotal)
+    return None
+
+
+def _rerank_unavailable(index) -> None:
+    print(f"Exact re-ranking unavailable: {index_encoding(index)} index was stored without raw vectors")
+
+
+def add_vectors(index, vectors, dimension: int, raw_vectors=None) -> Tuple:
+    """Add vectors to an index, converting it to the configured encoding if needed.
+    
+    `raw_vectors` are the exact float32 vectors already in the index when they
+    are kept on disk; otherwise they are reconstructed from the index if it is
+    flat. Returns `(index, raw)`, where `index` may be a new object and `raw`
+    holds the exact vectors of every entry when they should be kept for
+    re-ranking and are available (None otherwise).
+    """
+    import numpy as np
+    
+    total = (index.ntotal if index is not None else 0) + len(vectors)
+    encoding = target_encoding(total)
+    keep_raw = settings.vector_rerank and encoding != "flat"
+    reuse = index is not None and index_encoding(index) == encoding
+    
+    all_vectors = vectors
+    if index is not None and index.ntotal and (keep_raw or not reuse):
+        existing = exact_vectors(index, raw_vectors)
+        if existing is None:
+            # A quantized index without raw vectors can still be re-encoded
+            # from its reconstruction, but can no longer be re-ranked exactly
+            if keep_raw:
+                _rerank_unavailable(index)
+                keep_raw = False
+            if not reuse:
+                existing = index.reconstruct_n(0, index.ntotal)
+        if existing is not None:
+            all_vectors = np.vstack([np.asarray(existing, dtype="float32"), vectors])
+    
+    if reuse:
+        index.add(vectors)
+    else:
+        # Build (or rebuild) the index in the target encoding from all vectors
+        index = create_index(dimension, encoding, all_vectors)
+        index.add(all_vectors)
+    return index, (all_vectors if keep_raw else None)
+
+
+def needs_conversion(index) -> bool:
+    """Check whether a stored index differs from the configured encoding.
+    
+    Missing raw vectors are no reason to convert: they can only be recovered
+    from a flat index, which differs from any encoding that keeps them.
+    """
+    return index_encoding(index) != target_encoding(index.ntotal)
+
+
+def convert_index(index, raw_vectors=None) -> Tuple:
+    """Re-encode an existing index with the configured encoding.
+    
+    Returns `(index, raw)` like `add_vectors`.
+    """
+    import numpy as np
+    
+    encoding = target_encoding(index.ntotal)
+    keep_raw = settings.vector_rerank and encoding != "flat"
+    vectors = exact_vectors(index, raw_vectors)
+    if vectors is None:
+        if keep_raw:
+            _rerank_unavailable(index)
+            keep_raw = False
+        vectors = index.reconstruct_n(0, index.ntotal)
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    converted = create_index(index.d, encoding, vectors)
+    converted.add(vectors)
+    return converted, (vectors if keep_raw else None)
+
+
+def search(index, query_vectors, top_k: int, raw_vectors=None) -> Tuple:
+    """Search an index, re-ranking candidates exactly when raw vectors are available.
+    
+    Returns (distances, indices) shaped like `index.search`.
+    """
+    import numpy as np
+    
+    if raw_vectors is None or not settings.vector_rerank or index_encoding(index) == "flat":
+        return index.search(query_vectors, top_k)
+    
+    candidates = min(max(top_k, settings.rerank_candidates), index.ntotal)
+    _, candidate_ids = index.search(query_vectors, candidates)
+    all_distances = np.full((len(query_vectors), top_k), np.inf, dtype="float32")
+    all_indices = np.full((len(query_vectors), top_k), -1, dtype="int64")
+    for row, ids in enumerate(candidate_ids):
+        ids = np.sort(ids[ids >= 0])  # Sorted reads are friendlier to memory-mapped files
+        exact = np.asarray(raw_vectors[ids], dtype="float32")
+        distances = ((exact - query_vectors[row]) ** 2).sum(axis=1)
+        order = np.argsort(distances)[:top_k]
+        all_distances[row, :len(order)] = distances[order]
+        all_indices[row, :len(order)] = ids[order]
+    return all_distances, all_indices
+
+
+# On-disk layout, one directory per thread:
+#
+#   thread_<id>/CURRENT              name of the live generation, e.g. "000007"
+#   thread_<id>/gen-000007/
+#       index.faiss                  FAISS index
+#       chunks.bin                   UTF-8 chunk texts, concatenated
+#       offsets.npy                  int64 start offset of every chunk (+ end)
+#       source_ids.npy               int32 index into sources.json per chunk
+#       sources.json                 source (file) names
+#       vectors.npy                  exact float32 vectors, kept for re-ranking
+#                                    (absent when only lossy codes exist)
+#
+# Generations are immutable. Writers build a new one in a temporary directory,
+# rename it into place and then atomically replace CURRENT, so readers never
+# see a partial generation and need no locks. Readers map the files
+# read-only, which lets uvicorn workers share them through the page cache.
+CURRENT_FILE = "CURRENT"
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "offsets.npy"
+SOURCE_IDS_FILE = "source_ids.npy"
+SOURCES_FILE = "sources.json"
+VECTORS_FILE = "vectors.npy"
+
+
+class ChunkStore:
+    """Read-only chunk texts and source names backed by memory-mapped files."""
+    
+    def __init__(self, directory: str):
+        import numpy as np
+        
+        self._offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        self._source_ids = np.load(os.path.join(directory, SOURCE_IDS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, SOURCES_FILE), encoding="utf-8") as f:
+            self._sources = json.load(f)
+        
+        self._text = b""
+        chunks_path = os.path.join(directory, CHUNKS_FILE)
+        if os.path.getsize(chunks_path):
+            with open(chunks_path, "rb") as f:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def text(self, position: int) -> str:
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        return self._text[start:end].decode("utf-8")
+    
+    def source(self, position: int) -> str:
+        return self._sources[int(self._source_ids[position])]
+    
+    def __getitem__(self, position: int) -> dict:
+        """Chunk metadata in the shape the pickled metadata list used to have."""
+        return {
+            "source": self.source(position),
+            "chunk_index": position,
+            "text": self.text(position),
+        }
+    
+    def texts(self) -> Iterator[str]:
+        return (self.text(i) for i in range(len(self)))
+    
+    def sources(self) -> Iterator[str]:
+        return (self.source(i) for i in range(len(self)))
+
+
+class ThreadIndex:
+    """One published generation of a thread's index and chunks."""
+    
+    def __init__(self, generation: str, index, chunks, raw_vectors=None):
+        self.generation = generation
+        self.index = index
+        self.chunks = chunks
+        self.raw_vectors = raw_vectors
+
+
+def thread_dir(thread_id: int) -> str:
+    """Get the directory holding a thread's index generations."""
+    return os.path.join(settings.faiss_persist_dir, f"thread_{thread_id}")
+
+
+def _legacy_paths(thread_id: int) -> Tuple[str, str, str]:
+    """Index, pickled metadata and vector files written before generations existed."""
+    base = os.path.join(settings.faiss_persist_dir, f"thread_{thread_id}")
+    return f"{base}.index", f"{base}_metadata.pkl", f"{base}_vectors.npy"
+
+
+def current_generation(thread_id: int) -> Optional[str]:
+    """Get the name of the live generation, or None if nothing was published."""
+    try:
+        with open(os.path.join(thread_dir(thread_id), CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def has_index(thread_id: int) -> bool:
+    """Check whether a thread has any stored vectors."""
+    return current_generation(thread_id) is not None or os.path.exists(_legacy_paths(thread_id)[0])
+
+
+def open_generation(thread_id: int, generation: str, writable: bool = False) -> ThreadIndex:
+    """Open a generation memory-mapped and read-only (or fully loaded when `writable`)."""
+    import faiss
+    import numpy as np
+    
+    directory = os.path.join(thread_dir(thread_id), f"gen-{generation}")
+    index_path = os.path.join(directory, INDEX_FILE)
+    if writable:
+        index = faiss.read_index(index_path)
+    else:
+        # IO_FLAG_MMAP_IFC maps flat/SQ/PQ codes instead of copying them (faiss >= 1.11)
+        flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(index_path, flags)
+    
+    vectors_path = os.path.join(directory, VECTORS_FILE)
+    raw_vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+    if not writable and raw_vectors is None and settings.vector_rerank and index_encoding(index) != "flat":
+        print(f"Thread {thread_id} generation {generation}: exact re-ranking unavailable without raw vectors")
+    return ThreadIndex(generation, index, ChunkStore(directory), raw_vectors)
+
+
+_cache: "OrderedDict[int, ThreadIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_thread_index(thread_id: int) -> Optional[ThreadIndex]:
+    """Get the live generation for reading, reusing the mapping while it is current."""
+    generation = current_generation(thread_id)
+    if generation is None:
+        if not os.path.exists(_legacy_paths(thread_id)[0]):
+            return None
+        # Indexes from before generations existed are converted on first read
+        migrate_legacy(thread_id)
+        generation = current_generation(thread_id)
+    
+    with _cache_lock:
+        cached = _cache.get(thread_id)
+        if cached is not None and cached.generation == generation:
+            _cache.move_to_end(thread_id)
+            return cached
+    
+    try:
+        thread_index = open_generation(thread_id, generation)
+    except (FileNotFoundError, RuntimeError):
+        # Pruned by a writer between reading CURRENT and opening it (faiss reports a
+        # missing file as RuntimeError); take the newer one
+        latest = current_generation(thread_id)
+        if latest == generation:
+            raise
+        generation = latest
+        thread_index = open_generation(thread_id, generation)
+    
+    with _cache_lock:
+        _cache[thread_id] = thread_index
+        _cache.move_to_end(thread_id)
+        while len(_cache) > settings.index_cache_size:
+            _cache.popitem(last=False)
+    return thread_index
+
+
+@contextmanager
+def writer_lock(thread_id: int):
+    """Serialise writers of one thread's index across processes."""
+    directory = thread_dir(thread_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_for_update(thread_id: int) -> Optional[ThreadIndex]:
+    """Get the live generation with a modifiable index. Call under `writer_lock`."""
+    if current_generation(thread_id) is None:
+        _migrate_legacy_locked(thread_id)
+    generation = current_generation(thread_id)
+    if generation is None:
+        return None
+    return open_generation(thread_id, generation, writable=True)
+
+
+def _write_chunks(directory: str, texts: List[str], sources: List[str]) -> None:
+    import numpy as np
+    
+    source_names = list(dict.fromkeys(sources))
+    source_ids = {name: i for i, name in enumerate(source_names)}
+    offsets = np.zeros(len(texts) + 1, dtype="int64")
+    with open(os.path.join(directory, CHUNKS_FILE), "wb") as f:
+        for i, text in enumerate(texts):
+            data = text.encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(os.path.join(directory, OFFSETS_FILE), offsets)
+    np.save(
+        os.path.join(directory, SOURCE_IDS_FILE),
+        np.array([source_ids[name] for name in sources], dtype="int32"),
+    )
+    with open(os.path.join(directory, SOURCES_FILE), "w", encoding="utf-8") as f:
+        json.dump(source_names, f)
+
+
+def publish_generation(thread_id: int, index, texts: List[str], sources: List[str], raw_vectors=None) -> str:
+    """Write a new generation and make it live. Call under `writer_lock`."""
+    import faiss
+    import numpy as np
+    
+    directory = thread_dir(thread_id)
+    os.makedirs(directory, exist_ok=True)
+    # Number past every existing directory: a writer that crashed after renaming its
+    # generation into place, but before updating CURRENT, leaves an orphan behind
+    numbers = [int(name[len("gen-"):]) for name in os.listdir(directory) if name.startswith("gen-")]
+    current = current_generation(thread_id)
+    if current:
+        numbers.append(int(current))
+    generation = f"{max(numbers, default=0) + 1:06d}"
+    
+    tmp_dir = os.path.join(directory, f".tmp-{generation}-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    faiss.write_index(index, os.path.join(tmp_dir, INDEX_FILE))
+    _write_chunks(tmp_dir, texts, sources)
+    if raw_vectors is not None:
+        np.save(os.path.join(tmp_dir, VECTORS_FILE), np.ascontiguousarray(raw_vectors, dtype="float32"))
+    os.rename(tmp_dir, os.path.join(directory, f"gen-{generation}"))
+    
+    # Flip the version marker atomically; readers pick up the new generation on their next lookup
+    marker_tmp = os.path.join(directory, f".{CURRENT_FILE}.{os.getpid()}")
+    with open(marker_tmp, "w", encoding="utf-8") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(marker_tmp, os.path.join(directory, CURRENT_FILE))
+    
+    # Keep the previous generation for readers still finishing a search
+    _prune(directory, keep={generation, current})
+    return generation
+
+
+def _prune(directory: str, keep: set) -> None:
+    """Remove generations other than `keep`, orphans included (open mappings stay valid on POSIX)."""
+    for name in os.listdir(directory):
+        if name.startswith("gen-") and name[len("gen-"):] not in keep:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def migrate_legacy(thread_id: int) -> None:
+    """Republish a pre-generation index/pickle pair as the first generation."""
+    with writer_lock(thread_id):
+        _migrate_legacy_locked(thread_id)
+
+
+def _migrate_legacy_locked(thread_id: int) -> None:
+    import faiss
+    import pickle
+    import numpy as np
+    
+    index_path, metadata_path, vectors_path = _legacy_paths(thread_id)
+    if current_generation(thread_id) is not None or not os.path.exists(index_path):
+        return  # Nothing to migrate, or another worker got there first
+    index = faiss.read_index(index_path)
+    with open(metadata_path, "rb") as f:
+        metadata_list = pickle.load(f)
+    raw_vectors = np.load(vectors_path) if os.path.exists(vectors_path) else None
+    publish_generation(
+        thread_id,
+        index,
+        [metadata.get("text", "") for metadata in metadata_list],
+        [metadata.get("source", "Unknown") for metadata in metadata_list],
+        raw_vectors,
+    )
+    for path in (index_path, metadata_path, vectors_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def convert_thread_index(thread_id: int) -> Optional[ThreadIndex]:
+    """Re-encode a thread's live generation with the configured encoding and publish it."""
+    with writer_lock(thread_id):
+        current = load_for_update(thread_id)
+        if current is not None and needs_conversion(current.index):
+            index, raw_vectors = convert_index(current.index, current.raw_vectors)
+            publish_generation(
+                thread_id, index, list(current.chunks.texts()), list(current.chunks.sources()), raw_vectors
+            )
+    return load_thread_index(thread_id)
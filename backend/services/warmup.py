@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict
+
+from ..config import get_settings
+from . import embeddings
+
+settings = get_settings()
+
+# Components reported by the /ready endpoint, warmed in this order
+COMPONENTS = ("database", "vector_store", "embedding_model")
+
+_state: Dict[str, dict] = {name: {"status": "cold"} for name in COMPONENTS}
+_lock = threading.Lock()
+
+
+def mark(component: str, status: str, **details) -> None:
+    """Record the state of a component ('cold', 'warming', 'ready' or 'failed')."""
+    with _lock:
+        _state[component] = {"status": status, **details}
+
+
+def _warm_database() -> None:
+    from sqlalchemy import text
+    from ..database import engine
+    
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def _warm_vector_store() -> None:
+    import faiss  # noqa: F401
+    import numpy  # noqa: F401
+    
+    os.makedirs(settings.faiss_persist_dir, exist_ok=True)
+
+
+def _warm_embedding_model() -> None:
+    embeddings.get_embedding_backend().encode(["warm-up"])
+
+
+_WARMERS = {
+    "database": _warm_database,
+    "vector_store": _warm_vector_store,
+    "embedding_model": _warm_embedding_model,
+}
+
+
+def warm_up() -> None:
+    """Load heavy components ahead of the first request (runs in a background thread)."""
+    for component in COMPONENTS:
+        if _state[component]["status"] == "ready":
+            continue
+        mark(component, "warming")
+        started = time.perf_counter()
+        try:
+            _WARMERS[component]()
+        except Exception as e:
+            print(f"Warm-up of {component} failed: {e}")
+            mark(component, "failed", error=str(e))
+            continue
+        mark(component, "ready", seconds=round(time.perf_counter() - started, 3))
+
+
+def readiness() -> Dict[str, dict]:
+    """Get a snapshot of component states.
+    
+    Components that were loaded lazily by a request count as ready even if
+    the background warm-up never ran.
+    """
+    with _lock:
+        state = {name: dict(info) for name, info in _state.items()}
+    if state["embedding_model"]["status"] != "ready" and embeddings.is_loaded():
+        state["embedding_model"] = {"status": "ready"}
+    if state["vector_store"]["status"] != "ready" and "faiss" in sys.modules:
+        state["vector_store"] = {"status": "ready"}
+    return state
@@ -0,0 +1 @@
+"""Offline benchmark suite for document ingestion and retrieval."""
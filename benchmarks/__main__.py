@@ -0,0 +1,162 @@
+"""Command line entry point: `python -m benchmarks <ingest|retrieve|embeddings|encodings|search|loadtest|startup|compare>`."""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from .common import EMBEDDING_CHOICES, load_embedding_model, setup_environment, write_results
+
+
+def _add_common(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--embedding", choices=EMBEDDING_CHOICES, default="stub",
+                        help="stub = offline hashing embedder, otherwise an embedding backend")
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2",
+                        help="Model name or local path for real embedding backends")
+    parser.add_argument("--workdir", help="Scratch directory (default: a fresh temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<stamp>_<name>.json)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def _compare(paths):
+    """Print numeric differences between two result files, leaf by leaf."""
+    with open(paths[0]) as f:
+        base = json.load(f)
+    with open(paths[1]) as f:
+        head = json.load(f)
+
+    def walk(a, b, prefix=""):
+        if isinstance(a, dict) and isinstance(b, dict):
+            for key in a:
+                if key in b:
+                    walk(a[key], b[key], f"{prefix}.{key}" if prefix else key)
+        elif isinstance(a, list) and isinstance(b, list):
+            for i, (x, y) in enumerate(zip(a, b)):
+                walk(x, y, f"{prefix}[{i}]")
+        elif isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"{prefix:60s} {a:>12} -> {b:<12} {change}")
+
+    print(f"base: {base.get('git_revision')} {base['timestamp']}")
+    print(f"head: {head.get('git_revision')} {head['timestamp']}")
+    walk(base["results"], head["results"], "results")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Ingestion throughput (pages/s, chunks/s, peak RSS)")
+    _add_common(ingest)
+    ingest.add_argument("--file-types", nargs="+", default=[".pdf", ".docx", ".txt"],
+                        choices=[".pdf", ".docx", ".txt"])
+    ingest.add_argument("--files", type=int, default=10, help="Documents per file type")
+    ingest.add_argument("--pages", type=int, default=20, help="Pages per document")
+    ingest.add_argument("--words-per-page", type=int, default=400)
+
+    retrieve = sub.add_parser("retrieve", help="Retrieval latency percentiles by index size")
+    _add_common(retrieve)
+    retrieve.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000],
+                          help="Index sizes in chunks (e.g. 1000 10000 100000 1000000)")
+    retrieve.add_argument("--queries", type=int, default=50)
+    retrieve.add_argument("--top-k", type=int, default=3)
+
+    embeddings = sub.add_parser("embeddings", help="Compare embedding backends (throughput, agreement)")
+    _add_common(embeddings)
+    embeddings.add_argument("--backends", nargs="+", choices=EMBEDDING_CHOICES,
+                            default=["sentence-transformers", "quantized-cpu"],
+                            help="Backends to compare; the first one is the reference")
+    embeddings.add_argument("--files", type=int, default=5)
+    embeddings.add_argument("--pages", type=int, default=10)
+    embeddings.add_argument("--queries", type=int, default=100)
+    embeddings.add_argument("--top-k", type=int, default=5)
+
+    encodings = sub.add_parser("encodings", help="Memory and recall per vector encoding")
+    _add_common(encodings)
+    encodings.add_argument("--encodings", nargs="+", default=["flat", "fp16", "sq8", "pq"],
+                           choices=["flat", "fp16", "sq8", "pq"])
+    encodings.add_argument("--size", type=int, default=50_000, help="Vectors in the index")
+    encodings.add_argument("--dim", type=int, default=384)
+    encodings.add_argument("--clusters", type=int, default=200)
+    encodings.add_argument("--queries", type=int, default=200)
+    encodings.add_argument("--top-k", type=int, default=10)
+    encodings.add_argument("--rerank-candidates", type=int, default=50)
+
+    search = sub.add_parser("search", help="Message search latency by history size")
+    _add_common(search)
+    search.add_argument("--sizes", nargs="+", type=int, default=[100_000, 1_000_000],
+                        help="Stored messages per measurement (e.g. 10000 100000 1000000)")
+    search.add_argument("--threads", type=int, default=1_000, help="Threads the messages are spread over")
+    search.add_argument("--vocabulary", type=int, default=50_000, help="Distinct words in the synthetic text")
+    search.add_argument("--queries", type=int, default=50, help="Queries per term class and scope")
+    search.add_argument("--limit", type=int, default=20, help="Results per page")
+
+    loadtest = sub.add_parser("loadtest", help="Concurrent /api/chat streams against local API stubs")
+    _add_common(loadtest)
+    loadtest.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50],
+                          help="Concurrent simulated users per level")
+    loadtest.add_argument("--turns", type=int, default=2, help="Chat turns per user")
+    loadtest.add_argument("--search-ratio", type=float, default=0.2, help="Share of chats with web search")
+    loadtest.add_argument("--upload-ratio", type=float, default=0.1, help="Share of users uploading a document")
+    loadtest.add_argument("--upload-pages", type=int, default=5)
+    loadtest.add_argument("--token-rate", type=float, default=50.0, help="Stub LLM tokens per second")
+    loadtest.add_argument("--first-token-latency", type=float, default=0.3, help="Stub LLM seconds to first token")
+    loadtest.add_argument("--tokens", type=int, default=200, help="Stub LLM tokens per response")
+    loadtest.add_argument("--search-latency", type=float, default=0.5, help="Stub search seconds per call")
+    loadtest.add_argument("--timeout", type=float, default=300.0, help="Client timeout per request")
+
+    startup = sub.add_parser("startup", help="Import and startup time regression check")
+    _add_common(startup)
+    startup.add_argument("--repeats", type=int, default=5, help="Fresh-interpreter import measurements")
+    startup.add_argument("--ready-timeout", type=float, default=120.0, help="Seconds to wait for /ready")
+    startup.add_argument("--max-import-seconds", type=float, help="Fail if importing backend.main is slower")
+    startup.add_argument("--max-health-seconds", type=float, help="Fail if /health answers later than this")
+
+    compare = sub.add_parser("compare", help="Diff two result files")
+    compare.add_argument("files", nargs=2)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        _compare(args.files)
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="chatbot-bench-")
+    try:
+        if args.command in ("loadtest", "startup"):
+            # The app runs in a subprocess that gets its environment from the harness
+            from . import loadtest, startup
+            results = (loadtest if args.command == "loadtest" else startup).run(args, workdir)
+        elif args.command in ("embeddings", "encodings", "search"):
+            setup_environment(workdir)
+            from . import embedding_backends, message_search, vector_encodings
+            module = {"embeddings": embedding_backends, "encodings": vector_encodings,
+                      "search": message_search}[args.command]
+            results = module.run(args, workdir)
+        else:
+            setup_environment(workdir)
+            embedding_model = load_embedding_model(args.embedding, args.embedding_model)
+            if args.command == "ingest":
+                from . import ingestion
+                results = ingestion.run(args, workdir, embedding_model)
+            else:
+                from . import retrieval
+                results = retrieval.run(args, workdir, embedding_model)
+        params = {k: v for k, v in vars(args).items() if k not in ("workdir", "keep", "output")}
+        path = write_results(args.command, params, results, args.output)
+        print(f"Results written to {path}")
+        if args.command == "startup":
+            from . import startup
+            failures = startup.check(results, args)
+            for failure in failures:
+                print(f"FAIL: {failure}")
+            return 1 if failures else 0
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Shared helpers for the benchmark suite.
+
+Benchmarks never talk to the network: API keys are filled with dummy values,
+all storage goes to a scratch directory and the embedding model can be
+replaced by a deterministic hashing stub.
+"""
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+STUB_DIM = 384  # Same width as all-MiniLM-L6-v2 so index sizes are comparable
+# Names of backend.services.embeddings.BACKENDS, listed here because command
+# line parsing happens before setup_environment() allows backend imports
+EMBEDDING_CHOICES = ["stub", "sentence-transformers", "quantized-cpu"]
+
+
+def setup_environment(workdir: str) -> None:
+    """Point the backend at a scratch directory before it is imported.
+
+    `backend.config` reads settings once at import time, so this has to run
+    before any `backend.*` module is imported.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["FAISS_PERSIST_DIR"] = os.path.join(workdir, "faiss_db")
+    os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+    os.makedirs(os.environ["FAISS_PERSIST_DIR"], exist_ok=True)
+
+
+class StubEmbeddingModel:
+    """Deterministic bag-of-words hashing embedder.
+
+    Has the interface of backend.services.embeddings.EmbeddingBackend and
+    behaves like a real backend as far as the storage and search code paths
+    are concerned: texts sharing words get similar unit vectors.
+    """
+
+    name = "stub"
+
+    def __init__(self, dimension: int = STUB_DIM):
+        self.dimension = dimension
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                h = zlib.crc32(token.encode("utf-8"))
+                vectors[row, h % self.dimension] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class CountingEmbeddingModel:
+    """Wrap an embedding model and count how many texts it encoded."""
+
+    def __init__(self, model):
+        self.model = model
+        self.dimension = model.dimension
+        self.texts_encoded = 0
+
+    def encode(self, texts: List[str], **kwargs):
+        self.texts_encoded += len(texts)
+        return self.model.encode(texts, **kwargs)
+
+
+def load_embedding_model(kind: str, model_name_or_path: str = "all-MiniLM-L6-v2"):
+    """Return the stub embedder or one of the backend's embedding backends."""
+    if kind == "stub":
+        return StubEmbeddingModel()
+    from backend.services.embeddings import create_embedding_backend
+
+    return create_embedding_backend(kind, model_name_or_path)
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS counter for this process (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples: List[float], points=(50, 90, 95, 99)) -> Dict[str, float]:
+    """Summarise latency samples (seconds) as millisecond percentiles."""
+    if not samples:
+        return {}
+    arr = np.asarray(samples) * 1000
+    summary = {f"p{p}_ms": round(float(np.percentile(arr, p)), 3) for p in points}
+    summary["mean_ms"] = round(float(arr.mean()), 3)
+    summary["max_ms"] = round(float(arr.max()), 3)
+    return summary
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(RESULTS_DIR),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name: str, params: dict, results: list, output: Optional[str] = None) -> str:
+    """Write a benchmark run as JSON and return the file path."""
+    payload = {
+        "benchmark": name,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{name}.json")
+    with open(output, "w") as f:
+        json.dump(payload, f, indent=2)
+    return output
+
+
+class Timer:
+    """Context manager measuring wall-clock seconds."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,121 @@
+"""Synthetic PDF/DOCX/TXT corpus generation.
+
+Documents are built from a fixed vocabulary with a seeded RNG so the same
+parameters always produce byte-identical corpora.
+"""
+import os
+import random
+from dataclasses import dataclass
+from typing import List
+
+VOCABULARY = (
+    "account agent answer archive battery budget cache channel client cluster "
+    "compiler contract customer database deadline deploy document driver engine "
+    "feature filter forecast gateway hardware index invoice kernel latency ledger "
+    "license market memory metric network notebook payload pipeline policy "
+    "portfolio protocol quarter query record release report request revenue "
+    "router sample schema server session signal storage stream supplier system "
+    "ticket token traffic vector vendor version warehouse widget window workflow"
+).split()
+
+
+@dataclass
+class CorpusFile:
+    path: str
+    file_type: str
+    pages: int
+    size_bytes: int
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(VOCABULARY, k=rng.randint(8, 18))
+    return " ".join(words).capitalize() + "."
+
+
+def _page_lines(rng: random.Random, words_per_page: int) -> List[str]:
+    """Return one page of text as short lines (PDF text has no wrapping)."""
+    lines, count = [], 0
+    while count < words_per_page:
+        sentence = _sentence(rng)
+        count += sentence.count(" ") + 1
+        lines.append(sentence)
+    return lines
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[List[str]]) -> None:
+    """Write a minimal multi-page PDF with one Helvetica text block per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        stream = ["BT /F1 10 Tf 12 TL 40 800 Td"]
+        stream.extend(f"({_pdf_escape(line)}) '" for line in lines)
+        stream.append("ET")
+        content = "\n".join(stream).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_docx(path: str, pages: List[List[str]]) -> None:
+    """Write a DOCX with one paragraph per generated line and page breaks."""
+    import docx
+
+    document = docx.Document()
+    for number, lines in enumerate(pages):
+        if number:
+            document.add_page_break()
+        for line in lines:
+            document.add_paragraph(line)
+    document.save(path)
+
+
+def write_txt(path: str, pages: List[List[str]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join("\n".join(lines) for lines in pages))
+
+
+WRITERS = {".pdf": write_pdf, ".docx": write_docx, ".txt": write_txt}
+
+
+def generate_corpus(
+    directory: str,
+    file_types: List[str],
+    files_per_type: int,
+    pages_per_file: int,
+    words_per_page: int = 400,
+    seed: int = 0,
+) -> List[CorpusFile]:
+    """Generate `files_per_type` documents of every requested type."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    corpus = []
+    for file_type in file_types:
+        writer = WRITERS[file_type]
+        for number in range(files_per_type):
+            pages = [_page_lines(rng, words_per_page) for _ in range(pages_per_file)]
+            path = os.path.join(directory, f"doc_{number:04d}{file_type}")
+            writer(path, pages)
+            corpus.append(CorpusFile(path, file_type, pages_per_file, os.path.getsize(path)))
+    return corpus
@@ -0,0 +1,71 @@
+"""Compare embedding backends: encode throughput and retrieval agreement.
+
+Every backend embeds the same synthetic chunks and queries. Agreement is
+the mean overlap of each backend's top-k neighbours with those of the first
+(reference) backend, so `--backends sentence-transformers quantized-cpu`
+shows how much ranking quality the int8 model gives up for its speed.
+"""
+import os
+import random
+from typing import List
+
+import numpy as np
+
+from .common import Timer, load_embedding_model, peak_rss_mb, reset_peak_rss, StubEmbeddingModel
+from .corpus import generate_corpus
+
+
+def _top_k(chunk_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    """Exact cosine-similarity neighbours for every query."""
+    def normalise(m):
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return m / norms
+    scores = normalise(query_vectors) @ normalise(chunk_vectors).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run(args, workdir: str) -> List[dict]:
+    from backend.services.document_processor import DocumentProcessor
+
+    corpus = generate_corpus(os.path.join(workdir, "corpus"), [".txt"], files_per_type=args.files,
+                             pages_per_file=args.pages, seed=args.seed)
+    splitter = DocumentProcessor(embedding_model=StubEmbeddingModel()).text_splitter
+    chunks = []
+    for item in corpus:
+        with open(item.path, encoding="utf-8") as f:
+            chunks.extend(splitter.split_text(f.read()))
+    rng = random.Random(args.seed)
+    queries = [rng.choice(chunks).split(".")[0] for _ in range(args.queries)]
+
+    results, reference = [], None
+    for name in args.backends:
+        reset_peak_rss()
+        with Timer() as load_timer:
+            backend = load_embedding_model(name, args.embedding_model)
+        backend.encode(chunks[:8])  # Warm up kernels before timing
+        with Timer() as encode_timer:
+            chunk_vectors = np.asarray(backend.encode(chunks), dtype="float32")
+        with Timer() as query_timer:
+            query_vectors = np.asarray(backend.encode(queries), dtype="float32")
+        neighbours = _top_k(chunk_vectors, query_vectors, args.top_k)
+
+        result = {
+            "backend": name,
+            "dimension": int(chunk_vectors.shape[1]),
+            "chunks": len(chunks),
+            "load_seconds": round(load_timer.elapsed, 3),
+            "chunks_per_s": round(len(chunks) / encode_timer.elapsed, 2),
+            "query_ms": round(query_timer.elapsed / len(queries) * 1000, 3),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        if reference is None:
+            reference = neighbours
+        else:
+            overlap = [len(set(a) & set(b)) / args.top_k for a, b in zip(neighbours, reference)]
+            result["agreement_at_k"] = round(float(np.mean(overlap)), 4)
+            result["top1_agreement"] = round(float(np.mean(neighbours[:, 0] == reference[:, 0])), 4)
+        results.append(result)
+        print(f"[embeddings] {name}: {result['chunks_per_s']} chunks/s, "
+              f"agreement@{args.top_k} {result.get('agreement_at_k', 'reference')}")
+    return results
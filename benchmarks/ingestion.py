@@ -0,0 +1,55 @@
+"""Ingestion throughput benchmark for `DocumentProcessor.process_and_store`."""
+import asyncio
+import os
+from typing import List
+
+from .common import CountingEmbeddingModel, Timer, peak_rss_mb, reset_peak_rss
+from .corpus import generate_corpus
+
+
+def run(args, workdir: str, embedding_model) -> List[dict]:
+    from backend.services.document_processor import DocumentProcessor
+
+    corpus_dir = os.path.join(workdir, "corpus")
+    results = []
+    for thread_id, file_type in enumerate(args.file_types, start=1):
+        corpus = generate_corpus(
+            corpus_dir,
+            [file_type],
+            files_per_type=args.files,
+            pages_per_file=args.pages,
+            words_per_page=args.words_per_page,
+            seed=args.seed,
+        )
+        counter = CountingEmbeddingModel(embedding_model)
+        processor = DocumentProcessor(embedding_model=counter)
+        reset_peak_rss()
+
+        async def ingest():
+            for item in corpus:
+                await processor.process_and_store(
+                    file_path=item.path,
+                    thread_id=thread_id,
+                    filename=os.path.basename(item.path),
+                )
+
+        with Timer() as timer:
+            asyncio.run(ingest())
+
+        pages = sum(item.pages for item in corpus)
+        results.append({
+            "file_type": file_type,
+            "files": len(corpus),
+            "pages": pages,
+            "input_mb": round(sum(item.size_bytes for item in corpus) / 2**20, 3),
+            "chunks": counter.texts_encoded,
+            "seconds": round(timer.elapsed, 4),
+            "pages_per_s": round(pages / timer.elapsed, 2),
+            "chunks_per_s": round(counter.texts_encoded / timer.elapsed, 2),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+        print(
+            f"[ingest] {file_type}: {pages} pages, {counter.texts_encoded} chunks in "
+            f"{timer.elapsed:.2f}s ({results[-1]['chunks_per_s']} chunks/s)"
+        )
+    return results
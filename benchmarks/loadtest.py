@@ -0,0 +1,257 @@
+"""Concurrent `/api/chat` streaming load test against local API stand-ins.
+
+Starts the Groq/Tavily stubs and the backend as subprocesses, then drives
+simulated users at each requested concurrency level. Every user creates a
+thread, optionally uploads a document and runs a number of chat turns.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from .common import percentiles
+from .corpus import VOCABULARY, generate_corpus
+
+PROBE_INTERVAL = 0.1  # Seconds between /health probes used to estimate event-loop lag
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _spawn(module: str, args: List[str], env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", module, *args],
+        cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+async def _wait_ready(client, url: str, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before becoming ready")
+        try:
+            await client.get(url)
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} did not become ready within {timeout}s")
+
+
+async def _chat(client, base: str, thread_id: int, message: str, enable_search: bool) -> dict:
+    start = time.perf_counter()
+    first = last = None
+    gaps, tokens, error = [], 0, None
+    try:
+        async with client.stream(
+            "POST", f"{base}/api/chat",
+            json={"message": message, "thread_id": thread_id, "enable_search": enable_search},
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                error = f"HTTP {response.status_code}"
+            else:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if event.get("type") == "token":
+                        now = time.perf_counter()
+                        if first is None:
+                            first = now
+                        else:
+                            gaps.append(now - last)
+                        last = now
+                        tokens += 1
+                    elif event.get("type") == "error":
+                        error = event.get("error", "error event")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "ttft": first - start if first is not None else None,
+        "gaps": gaps,
+        "tokens": tokens,
+        "duration": time.perf_counter() - start,
+        "error": error,
+    }
+
+
+async def _upload(client, base: str, thread_id: int, path: str) -> dict:
+    start = time.perf_counter()
+    error = None
+    try:
+        with open(path, "rb") as f:
+            response = await client.post(
+                f"{base}/api/documents/upload",
+                files={"file": (os.path.basename(path), f.read())},
+                data={"thread_id": str(thread_id)},
+            )
+        if response.status_code != 201:
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"duration": time.perf_counter() - start, "error": error}
+
+
+async def _user(client, base: str, args, rng: random.Random, corpus: list, chats: list, uploads: list) -> None:
+    response = await client.post(f"{base}/api/threads", json={"title": "load test"})
+    thread_id = response.json()["id"]
+    if corpus and rng.random() < args.upload_ratio:
+        uploads.append(await _upload(client, base, thread_id, rng.choice(corpus).path))
+    for _ in range(args.turns):
+        message = " ".join(rng.choices(VOCABULARY, k=12)) + "?"
+        chats.append(await _chat(client, base, thread_id, message, rng.random() < args.search_ratio))
+
+
+async def _sample(stop: asyncio.Event, interval: float, sampler) -> None:
+    while not stop.is_set():
+        await sampler()
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _run_level(client, base: str, pid: int, args, concurrency: int, corpus: list) -> dict:
+    rng = random.Random(args.seed + concurrency)
+    chats, uploads, lag, rss = [], [], [], []
+    baseline_rss = _rss_mb(pid)
+    stop = asyncio.Event()
+
+    async def probe():
+        start = time.perf_counter()
+        try:
+            await client.get(f"{base}/health")
+            lag.append(time.perf_counter() - start)
+        except Exception:
+            pass
+
+    async def memory():
+        value = _rss_mb(pid)
+        if value is not None:
+            rss.append(value)
+
+    samplers = [
+        asyncio.create_task(_sample(stop, PROBE_INTERVAL, probe)),
+        asyncio.create_task(_sample(stop, PROBE_INTERVAL, memory)),
+    ]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _user(client, base, args, random.Random(rng.random()), corpus, chats, uploads)
+        for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*samplers)
+
+    ok = [c for c in chats if c["error"] is None]
+    peak_rss = max(rss) if rss else None
+    result = {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "chats": len(chats),
+        "chat_errors": len(chats) - len(ok),
+        "chat_error_rate": round((len(chats) - len(ok)) / len(chats), 4) if chats else 0.0,
+        "error_samples": sorted({c["error"] for c in chats if c["error"]})[:5],
+        "uploads": len(uploads),
+        "upload_errors": sum(1 for u in uploads if u["error"]),
+        "upload_latency": percentiles([u["duration"] for u in uploads]),
+        "ttft": percentiles([c["ttft"] for c in ok if c["ttft"] is not None]),
+        "inter_token": percentiles([g for c in ok for g in c["gaps"]]),
+        "stream_duration": percentiles([c["duration"] for c in ok]),
+        "tokens_per_s": round(sum(c["tokens"] for c in ok) / elapsed, 1),
+        "event_loop_lag": percentiles(lag),
+        "rss_baseline_mb": round(baseline_rss, 1) if baseline_rss else None,
+        "rss_peak_mb": round(peak_rss, 1) if peak_rss else None,
+        "rss_per_stream_mb": (
+            round((peak_rss - baseline_rss) / concurrency, 3) if peak_rss and baseline_rss else None
+        ),
+    }
+    print(
+        f"[loadtest] c={concurrency}: {len(chats)} chats, error rate {result['chat_error_rate']}, "
+        f"TTFT p50 {result['ttft'].get('p50_ms')} ms / p99 {result['ttft'].get('p99_ms')} ms, "
+        f"loop lag p99 {result['event_loop_lag'].get('p99_ms')} ms"
+    )
+    return result
+
+
+async def _drive(args, workdir: str, pids: dict, base: str, stub_base: str, processes: dict) -> List[dict]:
+    import httpx
+
+    corpus = []
+    if args.upload_ratio > 0:
+        corpus = generate_corpus(os.path.join(workdir, "corpus"), [".txt"], files_per_type=10,
+                                 pages_per_file=args.upload_pages, seed=args.seed)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(args.timeout), limits=limits) as client:
+        await _wait_ready(client, f"{stub_base}/docs", processes["stubs"])
+        await _wait_ready(client, f"{base}/health", processes["app"])
+        results = []
+        for concurrency in args.concurrency:
+            results.append(await _run_level(client, base, pids["app"], args, concurrency, corpus))
+        return results
+
+
+def run(args, workdir: str) -> List[dict]:
+    os.makedirs(workdir, exist_ok=True)
+    stub_port, app_port = _free_port(), _free_port()
+    stub_base = f"http://127.0.0.1:{stub_port}"
+    base = f"http://127.0.0.1:{app_port}"
+
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "loadtest",
+        "TAVILY_API_KEY": "loadtest",
+        "GROQ_BASE_URL": stub_base,
+        "TAVILY_BASE_URL": stub_base,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "FAISS_PERSIST_DIR": os.path.join(workdir, "faiss_db"),
+    })
+
+    processes = {
+        "stubs": _spawn("benchmarks.stubs", [
+            "--port", str(stub_port),
+            "--token-rate", str(args.token_rate),
+            "--first-token-latency", str(args.first_token_latency),
+            "--tokens", str(args.tokens),
+            "--search-latency", str(args.search_latency),
+        ], env, os.path.join(workdir, "stubs.log")),
+        "app": _spawn("benchmarks.serve", [
+            "--port", str(app_port), "--embedding", args.embedding,
+            "--embedding-model", args.embedding_model,
+        ], env, os.path.join(workdir, "app.log")),
+    }
+    try:
+        pids = {name: p.pid for name, p in processes.items()}
+        return asyncio.run(_drive(args, workdir, pids, base, stub_base, processes))
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
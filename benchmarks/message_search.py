@@ -0,0 +1,125 @@
+"""Message search latency at scale.
+
+Fills the database with synthetic messages whose words follow a Zipf
+distribution (a few very common words and a long tail of rare ones), with
+the full-text index kept up to date by its triggers as in the app. It then
+times searches for rare, medium and common terms, across all threads and
+within a single thread. Before timing, it checks that paging through a query
+with more matches than the rank window returns every match exactly once.
+"""
+import random
+from typing import List
+
+import numpy as np
+
+from .common import Timer, peak_rss_mb, percentiles, reset_peak_rss
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "vo", "sa", "dri", "pel", "un", "or", "chi", "bex", "tu", "fen", "ya"]
+# Word ranks each query class draws from (0 = most frequent word)
+QUERY_CLASSES = {"common": (0, 50), "medium": (200, 2_000), "rare": (5_000, 50_000)}
+
+
+def _vocabulary(rng: random.Random, size: int) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words, key=lambda w: rng.random())
+
+
+def _insert(engine, rng: np.random.Generator, words: np.ndarray, weights: np.ndarray,
+            count: int, threads: int, batch: int = 10_000) -> None:
+    from sqlalchemy import text
+
+    statement = text("INSERT INTO messages (thread_id, role, content, sources, truncated) "
+                     "VALUES (:thread_id, :role, :content, '[]', 0)")
+    for start in range(0, count, batch):
+        size = min(batch, count - start)
+        lengths = rng.integers(10, 80, size)
+        tokens = words[rng.choice(len(words), int(lengths.sum()), p=weights)]
+        rows, position = [], 0
+        for length in lengths:
+            rows.append({
+                "thread_id": int(rng.integers(1, threads + 1)),
+                "role": "user" if rng.random() < 0.5 else "assistant",
+                "content": " ".join(tokens[position:position + length]),
+            })
+            position += length
+        with engine.begin() as connection:
+            connection.execute(statement, rows)
+
+
+def _check_paging(db, word: str, window: int = 50, limit: int = 20) -> None:
+    from sqlalchemy import text
+    from backend.services import message_search
+
+    table = message_search.FTS_TABLE
+    rows = db.execute(text(f"SELECT rowid FROM {table} WHERE {table} MATCH :match"),
+                      {"match": message_search.build_match_query(word)})
+    expected = {row[0] for row in rows}
+    assert len(expected) > window, f"'{word}' matches only {len(expected)} messages"
+    saved = message_search.settings.message_search_rank_window
+    message_search.settings.message_search_rank_window = window
+    try:
+        seen, offset, has_more = [], 0, True
+        while has_more:
+            page, has_more = message_search.search(db, word, limit=limit, offset=offset)
+            seen.extend(result["message_id"] for result in page)
+            offset += limit
+    finally:
+        message_search.settings.message_search_rank_window = saved
+    assert len(seen) == len(set(seen)) and set(seen) == expected, \
+        f"paging returned {len(set(seen))} of {len(expected)} matches ({len(seen) - len(set(seen))} repeated)"
+    print(f"[search] paging past a rank window of {window} returned all {len(expected)} matches")
+
+
+def run(args, workdir: str) -> List[dict]:
+    from sqlalchemy import text
+    from backend.database import SessionLocal, engine, init_db
+    from backend.services import message_search
+
+    init_db()
+    py_rng = random.Random(args.seed)
+    rng = np.random.default_rng(args.seed)
+    words = np.array(_vocabulary(py_rng, args.vocabulary))
+    weights = 1.0 / np.arange(1, len(words) + 1) ** 1.1
+    weights /= weights.sum()
+
+    with engine.begin() as connection:
+        for number in range(1, args.threads + 1):
+            connection.execute(text("INSERT INTO threads (id, title) VALUES (:id, :title)"),
+                               {"id": number, "title": f"Thread {number}"})
+
+    results = []
+    total = 0
+    for size in sorted(args.sizes):
+        with Timer() as insert_timer:
+            _insert(engine, rng, words, weights, size - total, args.threads)
+        inserted, total = size - total, size
+        if inserted == total:
+            with SessionLocal() as db:
+                _check_paging(db, str(words[0]))
+        reset_peak_rss()
+
+        latency = {}
+        with SessionLocal() as db:
+            for name, (low, high) in QUERY_CLASSES.items():
+                high = min(high, len(words))
+                for scope in ("all", "thread"):
+                    samples = []
+                    for _ in range(args.queries):
+                        terms = words[rng.integers(low, high, py_rng.randint(1, 2))]
+                        thread_id = int(rng.integers(1, args.threads + 1)) if scope == "thread" else None
+                        with Timer() as timer:
+                            message_search.search(db, " ".join(terms), thread_id=thread_id, limit=args.limit)
+                        samples.append(timer.elapsed)
+                    latency[f"{name}_{scope}"] = percentiles(samples)
+
+        results.append({
+            "messages": size,
+            "insert_per_second": round(inserted / insert_timer.elapsed, 1),
+            "latency": latency,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+        summary = ", ".join(f"{key} p50 {value['p50_ms']} ms" for key, value in latency.items() if key.endswith("_all"))
+        print(f"[search] {size} messages: {summary}")
+    return results
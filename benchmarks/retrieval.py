@@ -0,0 +1,80 @@
+"""Retrieval latency benchmark for `RAGService.retrieve_context`.
+
+The first query against each index opens (maps) it and is reported as
+`cold_query_ms`; the latency percentiles cover the warm queries after it.
+
+Indexes are filled with random unit vectors so sizes up to millions of chunks
+can be built without running the embedding model over real text.
+"""
+import asyncio
+import os
+import random
+from typing import List
+
+import numpy as np
+
+from .common import Timer, peak_rss_mb, percentiles, reset_peak_rss
+from .corpus import VOCABULARY
+
+
+def build_index(thread_id: int, size: int, dim: int, seed: int) -> None:
+    """Publish a synthetic index generation the same way `DocumentProcessor` does."""
+    import faiss
+    from backend.services import vector_store
+
+    rng = np.random.default_rng(seed)
+    index = faiss.IndexFlatL2(dim)
+    batch = 50_000
+    for start in range(0, size, batch):
+        vectors = rng.standard_normal((min(batch, size - start), dim), dtype="float32")
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index.add(vectors)
+
+    words = random.Random(seed)
+    texts = [" ".join(words.choices(VOCABULARY, k=150)) for _ in range(size)]
+    sources = [f"doc_{i // 100:05d}.txt" for i in range(size)]
+    with vector_store.writer_lock(thread_id):
+        vector_store.publish_generation(thread_id, index, texts, sources)
+
+
+def run(args, workdir: str, embedding_model) -> List[dict]:
+    from backend.services import vector_store
+    from backend.services.rag_service import RAGService
+
+    rag_service = RAGService(embedding_model=embedding_model)
+    dim = embedding_model.encode(["probe"]).shape[1]
+    rng = random.Random(args.seed)
+    queries = [" ".join(rng.choices(VOCABULARY, k=8)) for _ in range(args.queries)]
+
+    results = []
+    for thread_id, size in enumerate(args.sizes, start=1000):
+        with Timer() as build_timer:
+            build_index(thread_id, size, dim, args.seed)
+        reset_peak_rss()
+
+        async def measure():
+            with Timer() as cold:
+                await rag_service.retrieve_context(query=queries[0], thread_id=thread_id, top_k=args.top_k)
+            samples = []
+            for query in queries:
+                with Timer() as timer:
+                    await rag_service.retrieve_context(query=query, thread_id=thread_id, top_k=args.top_k)
+                samples.append(timer.elapsed)
+            return cold.elapsed, samples
+
+        cold_seconds, samples = asyncio.run(measure())
+        index_path = os.path.join(vector_store.thread_dir(thread_id),
+                                  f"gen-{vector_store.current_generation(thread_id)}", vector_store.INDEX_FILE)
+        results.append({
+            "index_size": size,
+            "queries": len(samples),
+            "top_k": args.top_k,
+            "build_seconds": round(build_timer.elapsed, 3),
+            "index_mb": round(os.path.getsize(index_path) / 2**20, 2),
+            "cold_query_ms": round(cold_seconds * 1000, 3),
+            "latency": percentiles(samples),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+        print(f"[retrieve] {size} chunks: p50 {results[-1]['latency']['p50_ms']} ms, "
+              f"p99 {results[-1]['latency']['p99_ms']} ms")
+    return results
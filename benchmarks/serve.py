@@ -0,0 +1,36 @@
+"""Run the backend for load tests, optionally with the stub embedder.
+
+`python -m benchmarks.serve --port 8100 --embedding stub` behaves like
+`uvicorn backend.main:app` except that document uploads and retrieval use
+the offline hashing embedder instead of downloading a model.
+"""
+import argparse
+import os
+
+from .common import EMBEDDING_CHOICES, StubEmbeddingModel
+
+
+def main(argv=None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.serve", description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embedding", choices=EMBEDDING_CHOICES, default="stub")
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args(argv)
+
+    if args.embedding == "stub":
+        from backend.services.embeddings import set_embedding_backend
+        set_embedding_backend(StubEmbeddingModel())
+    else:
+        # Settings are read on first use, so the environment still applies here
+        os.environ["EMBEDDING_BACKEND"] = args.embedding
+        os.environ["EMBEDDING_MODEL"] = args.embedding_model
+
+    from backend.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
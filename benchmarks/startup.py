@@ -0,0 +1,125 @@
+"""Import and startup time regression check.
+
+Measures how long `import backend.main` takes in a fresh interpreter, which
+heavy modules it pulls in eagerly, and how long a server process needs
+before `/health` and `/ready` answer. Exceeding a budget (or importing a
+heavy module at startup) makes the command exit non-zero so it can gate CI.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+from .loadtest import _free_port, _spawn
+
+# Modules that must only be imported on first use or by the warm-up thread
+HEAVY_MODULES = [
+    "torch", "sentence_transformers", "faiss", "numpy", "PyPDF2", "docx",
+    "langchain_groq", "langchain_text_splitters", "tavily", "PIL",
+]
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import backend.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _environment(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "startup",
+        "TAVILY_API_KEY": "startup",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "FAISS_PERSIST_DIR": os.path.join(workdir, "faiss_db"),
+    })
+    return env
+
+
+def measure_import(workdir: str, repeats: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples, loaded = [], set()
+    for _ in range(repeats):
+        output = subprocess.check_output(
+            [sys.executable, "-c", _IMPORT_PROBE], cwd=root, env=_environment(workdir), text=True,
+        )
+        probe = json.loads(output.strip().splitlines()[-1])
+        samples.append(probe["seconds"])
+        loaded.update(probe["loaded"])
+    return {
+        "repeats": repeats,
+        "median_s": round(statistics.median(samples), 4),
+        "max_s": round(max(samples), 4),
+        "heavy_modules_loaded": sorted(loaded),
+    }
+
+
+def measure_server(workdir: str, embedding: str, embedding_model: str, ready_timeout: float) -> dict:
+    import httpx
+
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = _spawn("benchmarks.serve", ["--port", str(port), "--embedding", embedding, "--embedding-model", embedding_model],
+                     _environment(workdir), os.path.join(workdir, "startup.log"))
+    health_s = ready_s = None
+    components = {}
+    try:
+        deadline = started + ready_timeout
+        with httpx.Client(timeout=5) as client:
+            while time.perf_counter() < deadline and process.poll() is None:
+                try:
+                    if health_s is None and client.get(f"{base}/health").status_code == 200:
+                        health_s = time.perf_counter() - started
+                    if health_s is not None:
+                        response = client.get(f"{base}/ready")
+                        components = response.json().get("components", {})
+                        if response.status_code == 200:
+                            ready_s = time.perf_counter() - started
+                            break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {
+        "time_to_health_s": round(health_s, 3) if health_s is not None else None,
+        "time_to_ready_s": round(ready_s, 3) if ready_s is not None else None,
+        "components": components,
+    }
+
+
+def run(args, workdir: str) -> List[dict]:
+    os.makedirs(workdir, exist_ok=True)
+    result = {
+        "import": measure_import(workdir, args.repeats),
+        "server": measure_server(workdir, args.embedding, args.embedding_model, args.ready_timeout),
+    }
+    print(f"[startup] import backend.main: {result['import']['median_s']}s "
+          f"(heavy modules: {result['import']['heavy_modules_loaded'] or 'none'})")
+    print(f"[startup] /health after {result['server']['time_to_health_s']}s, "
+          f"/ready after {result['server']['time_to_ready_s']}s")
+    return [result]
+
+
+def check(results: List[dict], args) -> List[str]:
+    """Return a list of budget violations (empty when the run passes)."""
+    failures = []
+    result = results[0]
+    if result["import"]["heavy_modules_loaded"]:
+        failures.append(f"heavy modules imported at startup: {result['import']['heavy_modules_loaded']}")
+    if args.max_import_seconds is not None and result["import"]["median_s"] > args.max_import_seconds:
+        failures.append(f"import took {result['import']['median_s']}s (budget {args.max_import_seconds}s)")
+    health = result["server"]["time_to_health_s"]
+    if health is None:
+        failures.append("/health never answered")
+    elif args.max_health_seconds is not None and health > args.max_health_seconds:
+        failures.append(f"/health took {health}s (budget {args.max_health_seconds}s)")
+    return failures
@@ -0,0 +1,119 @@
+"""Local stand-ins for the Groq chat completions and Tavily search APIs.
+
+Run with `python -m benchmarks.stubs --port 9100`. Point the backend at it
+with GROQ_BASE_URL / TAVILY_BASE_URL set to `http://127.0.0.1:9100`.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .corpus import VOCABULARY
+
+
+def create_app(
+    token_rate: float = 50.0,
+    first_token_latency: float = 0.3,
+    tokens_per_response: int = 200,
+    search_latency: float = 0.5,
+    jitter: float = 0.1,
+) -> FastAPI:
+    """Build the stub app; latencies are in seconds, token_rate in tokens/s."""
+    app = FastAPI(title="Upstream API stubs")
+    rng = random.Random(0)
+
+    def _delay(base: float) -> float:
+        return max(0.0, base * (1 + rng.uniform(-jitter, jitter)))
+
+    def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+        body = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+        }
+        if finish_reason:
+            body["x_groq"] = {"id": completion_id, "usage": {
+                "prompt_tokens": 100, "completion_tokens": tokens_per_response,
+                "total_tokens": 100 + tokens_per_response,
+            }}
+        return f"data: {json.dumps(body)}\n\n"
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        model = payload.get("model", "stub-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = rng.choices(VOCABULARY, k=tokens_per_response)
+
+        if not payload.get("stream"):
+            await asyncio.sleep(_delay(first_token_latency) + tokens_per_response / token_rate)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words[:4])},
+                    "logprobs": None,
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 4, "total_tokens": 104},
+            })
+
+        async def stream():
+            await asyncio.sleep(_delay(first_token_latency))
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for word in words:
+                yield _chunk(completion_id, model, {"content": word + " "})
+                await asyncio.sleep(_delay(1.0 / token_rate))
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/search")
+    async def search(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(_delay(search_latency))
+        query = payload.get("query", "")
+        results = [
+            {
+                "title": f"Result {i} for {query[:40]}",
+                "url": f"https://example.com/{i}",
+                "content": " ".join(rng.choices(VOCABULARY, k=60)),
+                "score": 0.9 - i * 0.1,
+            }
+            for i in range(payload.get("max_results", 3))
+        ]
+        return {"query": query, "answer": " ".join(rng.choices(VOCABULARY, k=30)),
+                "results": results, "response_time": search_latency}
+
+    return app
+
+
+def main(argv=None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stubs", description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Tokens per second per stream")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens per streamed response")
+    parser.add_argument("--search-latency", type=float, default=0.5, help="Seconds per search call")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Relative random jitter on delays")
+    args = parser.parse_args(argv)
+    app = create_app(args.token_rate, args.first_token_latency, args.tokens, args.search_latency, args.jitter)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
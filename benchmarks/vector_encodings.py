@@ -0,0 +1,61 @@
+"""Memory and recall of each vector encoding, with and without exact re-ranking.
+
+Vectors are drawn around random cluster centres (closer to real embeddings
+than isotropic noise) and recall@k is measured against exact flat search.
+"""
+import os
+from typing import List
+
+import numpy as np
+
+from .common import Timer, percentiles
+
+
+def _clustered_vectors(rng, count: int, dim: int, clusters: int) -> np.ndarray:
+    centres = rng.standard_normal((clusters, dim), dtype="float32")
+    vectors = centres[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dim), dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def run(args, workdir: str) -> List[dict]:
+    # Re-ranking must be enabled for vector_store.search to use raw vectors
+    os.environ["VECTOR_RERANK"] = "true"
+    os.environ["RERANK_CANDIDATES"] = str(args.rerank_candidates)
+    import faiss
+    from backend.services import vector_store
+
+    rng = np.random.default_rng(args.seed)
+    vectors = _clustered_vectors(rng, args.size, args.dim, args.clusters)
+    queries = _clustered_vectors(rng, args.queries, args.dim, args.clusters)
+    _, truth = faiss.knn(queries, vectors, args.top_k)
+
+    results = []
+    for encoding in args.encodings:
+        with Timer() as build_timer:
+            index = vector_store.create_index(args.dim, encoding, vectors)
+            index.add(vectors)
+        index_bytes = len(faiss.serialize_index(index))
+        for rerank in ([False, True] if encoding != "flat" else [False]):
+            raw = vectors if rerank else None
+            samples, found = [], []
+            for query in queries:
+                with Timer() as timer:
+                    _, ids = vector_store.search(index, query[None, :], args.top_k, raw)
+                samples.append(timer.elapsed)
+                found.append(ids[0])
+            recall = np.mean([len(set(f) & set(t)) / args.top_k for f, t in zip(found, truth)])
+            results.append({
+                "encoding": encoding,
+                "rerank": rerank,
+                "vectors": args.size,
+                "build_seconds": round(build_timer.elapsed, 3),
+                "index_mb": round(index_bytes / 2**20, 3),
+                "bytes_per_vector": round(index_bytes / args.size, 1),
+                "raw_vectors_mb_on_disk": round(vectors.nbytes / 2**20, 3) if rerank else 0.0,
+                "recall_at_k": round(float(recall), 4),
+                "latency": percentiles(samples),
+            })
+            print(f"[encodings] {encoding}{' +rerank' if rerank else ''}: "
+                  f"{results[-1]['bytes_per_vector']} B/vector, recall@{args.top_k} {results[-1]['recall_at_k']}")
+    return results
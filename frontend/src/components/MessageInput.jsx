@@ -8,6 +8,7 @@ const API_BASE_URL = `${API_URL}/api`;
 function MessageInput({ threadId, onMessageSent, onFileUpload, uploading }) {
     const [message, setMessage] = useState('');
     const [selectedImage, setSelectedImage] = useState(null);
+    const [selectedImageFile, setSelectedImageFile] = useState(null);
     const [enableSearch, setEnableSearch] = useState(false);
     const [isThinking, setIsThinking] = useState(false);
     const [isStreaming, setIsStreaming] = useState(false);
@@ -19,6 +20,7 @@ function MessageInput({ threadId, onMessageSent, onFileUpload, uploading }) {
     const menuRef = useRef(null);
     const recognitionRef = useRef(null);
     const abortControllerRef = useRef(null);
+    const streamIdRef = useRef(null);
 
     // Initialize Speech Recognition
     useEffect(() => {
@@ -91,6 +93,7 @@ function MessageInput({ threadId, onMessageSent, onFileUpload, uploading }) {
                     setSelectedImage(reader.result);
                 };
                 reader.readAsDataURL(file);
+                setSelectedImageFile(file);
             } else {
                 onFileUpload(file);
             }
@@ -100,10 +103,23 @@ function MessageInput({ threadId, onMessageSent, onFileUpload, uploading }) {
 
     const removeImage = () => {
         setSelectedImage(null);
+        setSelectedImageFile(null);
         if (fileInputRef.current) fileInputRef.current.value = '';
     };
 
     const handleStop = () => {
+        // Dropping the connection no longer stops generation (the stream stays resumable), so cancel it explicitly
+        if (streamIdRef.current) {
+            fetch(`${API_BASE_URL}/chat/${streamIdRef.current}/cancel`, { method: 'POST' })
+                .then((response) => {
+                    // Streams live in the worker that started them; another worker doesn't know this one
+                    if (response.status === 404) {
+                        alert('Could not stop the response: the server no longer has this stream. It may have finished already, or be running on another server worker.');
+                    }
+                })
+                .catch(() => {});
+            streamIdRef.current = null;
+        }
         if (abortControllerRef.current) {
             abortControllerRef.current.abort();
             abortControllerRef.current = null;
@@ -118,10 +134,11 @@ function MessageInput({ threadId, onMessageSent, onFileUpload, uploading }) {
         if ((!message.trim() && !selectedImage) || isStreaming) return;
 
         const userMessage = message;
-        const imagePayload = selectedImage;
+        const imageFile = selectedImageFile;
 
         setMessage('');
         setSelectedImage(null);
+        setSelectedImageFile(null);
         setIsStreaming(true);
         setStreamingContent('');
         setStatusMessage(isThinking ? 'Thinking deeply...' : 'Thinking...');
@@ -137,53 +154,119 @@ function MessageInput({ threadId, onMessageSent, onFileUpload, uploading }) {
         abortControllerRef.current = controller;
 
         try {
-            const response = await fetch(`${API_BASE_URL}/chat`, {
+            // Upload the image separately; the server downscales it and the chat request only carries its id
+            let imageId = null;
+            if (imageFile) {
+                const formData = new FormData();
+                formData.append('file', imageFile);
+                const imageResponse = await fetch(`${API_BASE_URL}/images`, {
+                    method: 'POST',
+                    body: formData,
+                    signal: controller.signal,
+                });
+                if (!imageResponse.ok) {
+                    const errorData = await imageResponse.json().catch(() => ({}));
+                    throw new Error(errorData.detail || 'Image upload failed');
+                }
+                imageId = (await imageResponse.json()).id;
+            }
+
+            let response = await fetch(`${API_BASE_URL}/chat`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    message: userMessage || (imagePayload ? "Analyze this image" : ""), // Ensure message isn't empty if only image
+                    message: userMessage || (imageId ? "Analyze this image" : ""), // Ensure message isn't empty if only image
                     thread_id: threadId,
                     enable_search: enableSearch,
                     thinking_mode: isThinking,
-                    image: imagePayload
+                    image_id: imageId
                 }),
                 signal: controller.signal,
             });
 
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-
-            while (true) {
-                const { value, done } = await reader.read();
-                if (done) break;
-
-                const chunk = decoder.decode(value);
-                const lines = chunk.split('\n');
-
-                for (const line of lines) {
-                    if (line.startsWith('data: ')) {
-                        const data = JSON.parse(line.slice(6));
+            const finish = () => {
+                setIsStreaming(false);
+                setStreamingContent('');
+                abortControllerRef.current = null;
+                streamIdRef.current = null;
+            };
 
-                        if (data.type === 'token') {
-                            setStreamingContent(prev => prev + data.content);
-                        } else if (data.type === 'status') {
-                            setStatusMessage(data.content);
-                        } else if (data.type === 'done') {
-                            setIsStreaming(false);
-                            setStreamingContent('');
-                            abortControllerRef.current = null;
+            let lastEventId = null;
+            let finished = false;
+            let reconnects = 0;
+
+            while (!finished) {
+                try {
+                    if (reconnects > 0) {
+                        // The connection dropped mid-answer: reattach and replay what was missed
+                        await new Promise(resolve => setTimeout(resolve, 1000 * reconnects));
+                        const streamId = lastEventId.split(':')[0];
+                        response = await fetch(`${API_BASE_URL}/chat/streams/${streamId}`, {
+                            headers: { 'Last-Event-ID': lastEventId },
+                            signal: controller.signal,
+                        });
+                        if (!response.ok) {
+                            // Expired or served elsewhere; the saved answer is in the thread
+                            finish();
                             onMessageSent();
-                        } else if (data.type === 'error') {
-                            console.error('Stream error:', data.error);
-                            alert('Error: ' + data.error);
-                            setIsStreaming(false);
-                            setStreamingContent('');
-                            abortControllerRef.current = null;
+                            break;
+                        }
+                    }
+
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+
+                    while (!finished) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+
+                        // Events can be split across chunks; keep the incomplete last line
+                        buffer += decoder.decode(value, { stream: true });
+                        const lines = buffer.split('\n');
+                        buffer = lines.pop();
+
+                        for (const line of lines) {
+                            if (line.startsWith('id: ')) {
+                                lastEventId = line.slice(4);
+                                reconnects = 0;
+                            } else if (line.startsWith('data: ')) {
+                                const data = JSON.parse(line.slice(6));
+
+                                if (data.type === 'stream') {
+                                    streamIdRef.current = data.stream_id;
+                                } else if (data.type === 'token') {
+                                    setStreamingContent(prev => prev + data.content);
+                                } else if (data.type === 'resync') {
+                                    // Missed too much to replay event by event: the answer so far
+                                    setStreamingContent(data.content);
+                                } else if (data.type === 'status') {
+                                    setStatusMessage(data.content);
+                                } else if (data.type === 'done') {
+                                    finished = true;
+                                    finish();
+                                    onMessageSent();
+                                } else if (data.type === 'cancelled') {
+                                    finished = true;
+                                    finish();
+                                    onMessageSent();
+                                } else if (data.type === 'error') {
+                                    console.error('Stream error:', data.error);
+                                    alert('Error: ' + data.error);
+                                    finished = true;
+                                    finish();
+                                }
+                            }
                         }
                     }
+                } catch (error) {
+                    if (error.name === 'AbortError' || !lastEventId || reconnects >= 5) throw error;
                 }
+                if (finished || !abortControllerRef.current) break;
+                if (!lastEventId || reconnects >= 5) throw new Error('Stream interrupted');
+                reconnects += 1;
             }
         } catch (error) {
             if (error.name === 'AbortError') {
@@ -195,6 +278,7 @@ function MessageInput({ threadId, onMessageSent, onFileUpload, uploading }) {
             setIsStreaming(false);
             setStreamingContent('');
             abortControllerRef.current = null;
+            streamIdRef.current = null;
         }
     };
 